@@ -1,12 +1,29 @@
 import logging
+import logging.handlers
 import os
+import sys
+import csv
+import argparse
+import queue
+import atexit
+import threading
+import asyncio
+import socket
+import importlib.util
+from time import monotonic
+from collections import Counter
+from functools import lru_cache
 from datetime import datetime, date, time
 import io
+import httpx
 import psycopg2
 from psycopg2 import sql
 from PIL import Image, ImageDraw, ImageFont
 from dotenv import load_dotenv
-from telegram import Update, ReplyKeyboardMarkup, KeyboardButton
+from telegram import Bot, Update, ReplyKeyboardMarkup, ReplyKeyboardRemove, KeyboardButton
+from telegram.constants import MessageLimit
+from telegram.error import NetworkError, RetryAfter, TelegramError, TimedOut
+from telegram.request import HTTPXRequest
 from telegram.ext import (
     Application,
     CommandHandler,
@@ -16,7 +33,6 @@ from telegram.ext import (
     ContextTypes
 )
 from dateutil.relativedelta import relativedelta
-from dateutil.relativedelta import relativedelta
 
 # Загружаем переменные окружения из файла .env
 load_dotenv()
@@ -27,6 +43,58 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Параметры логирования рассылки:
+# LOG_QUEUE=1 - запись логов в отдельном потоке через QueueHandler, чтобы не блокировать event loop
+# BROADCAST_LOG_SAMPLE - сколько ошибок каждого типа выводить построчно за один запуск рассылки
+#   (остальные учитываются только в итоговой сводке)
+LOG_QUEUE = os.environ.get('LOG_QUEUE', '1') == '1'
+BROADCAST_LOG_SAMPLE = int(os.environ.get('BROADCAST_LOG_SAMPLE', '10'))
+
+# Вариант и максимальные ширина и высота календаря в еженедельной рассылке
+# (компактнее, чем по запросу из меню)
+BROADCAST_CALENDAR_LAYOUT = os.environ.get('BROADCAST_CALENDAR_LAYOUT', 'weeks')
+BROADCAST_CALENDAR_WIDTH = int(os.environ.get('BROADCAST_CALENDAR_WIDTH', '320'))
+BROADCAST_CALENDAR_HEIGHT = int(os.environ.get('BROADCAST_CALENDAR_HEIGHT', '1280'))
+
+# Режим рассылки: local - бот отправляет уведомления сам, queue - бот только ставит
+# пользователей в очередь broadcast_queue, а отправляют воркеры (python bot.py broadcast-worker)
+BROADCAST_MODE = os.environ.get('BROADCAST_MODE', 'local')
+# Через сколько секунд взятая воркером, но не подтвержденная задача снова становится доступной
+BROADCAST_LEASE_SECONDS = int(os.environ.get('BROADCAST_LEASE_SECONDS', '600'))
+# Сколько дней хранить записи очереди прошлых рассылок
+BROADCAST_QUEUE_RETENTION_DAYS = int(os.environ.get('BROADCAST_QUEUE_RETENTION_DAYS', '28'))
+# Повторы при временных ошибках (429, таймауты, сеть): число попыток и базовая пауза,
+# которая удваивается с каждой попыткой
+BROADCAST_MAX_ATTEMPTS = int(os.environ.get('BROADCAST_MAX_ATTEMPTS', '5'))
+BROADCAST_RETRY_BASE_SECONDS = int(os.environ.get('BROADCAST_RETRY_BASE_SECONDS', '30'))
+# Воркер подтверждает задачи небольшими порциями, а не всей пачкой сразу
+BROADCAST_ACK_CHUNK = int(os.environ.get('BROADCAST_ACK_CHUNK', '10'))
+# Сколько уведомлений рассылки отправляется одновременно (бот и каждый воркер);
+# общий лимит Telegram - около 30 сообщений в секунду, при 429 все отправки ждут вместе
+BROADCAST_CONCURRENCY = int(os.environ.get('BROADCAST_CONCURRENCY', '8'))
+
+# Повторное нажатие той же кнопки меню, отправленное до ответа на предыдущее и не позже
+# чем через столько секунд после него, не обрабатывается заново
+MENU_DEBOUNCE_SECONDS = float(os.environ.get('MENU_DEBOUNCE_SECONDS', '2'))
+
+def setup_queue_logging():
+    """Переносит обработчики корневого логгера в фоновый поток через QueueHandler"""
+    root = logging.getLogger()
+    handlers = root.handlers[:]
+    if not handlers:
+        return None
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    for handler in handlers:
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+if LOG_QUEUE:
+    setup_queue_logging()
+
 # Константы для ConversationHandler
 MAIN_MENU, GET_NAME, GET_BIRTHDATE, EDIT_PROFILE, EDIT_NAME, EDIT_BIRTHDATE, EDIT_LIFE_EXPECTANCY = range(7)
 
@@ -37,16 +105,60 @@ DB_NAME = os.environ.get('DB_NAME', 'weekly_reminder')
 DB_USER = os.environ.get('DB_USER', 'postgres')
 DB_PASSWORD = os.environ.get('DB_PASSWORD', 'postgres')
 
+# Форматы еженедельного уведомления: статистика в подписи к календарю или только текст
+NOTIFICATION_MODE_PHOTO = 'photo'
+NOTIFICATION_MODE_TEXT = 'text'
+NOTIFICATION_MODE_TITLES = {
+    NOTIFICATION_MODE_PHOTO: "текст с календарем",
+    NOTIFICATION_MODE_TEXT: "только текст",
+}
+
+# Параметры исходящих соединений с Bot API: отдельные пулы для long polling,
+# ответов пользователям и еженедельной рассылки. Размеры по умолчанию совпадают
+# с python-telegram-bot (1 для getUpdates, 256 для остальных запросов), а пул
+# рассылки равен числу одновременных отправок - больше соединений она не займет
+HTTP_POOL_SIZE_UPDATES = int(os.environ.get('HTTP_POOL_SIZE_UPDATES', '1'))
+HTTP_POOL_SIZE_INTERACTIVE = int(os.environ.get('HTTP_POOL_SIZE_INTERACTIVE', '256'))
+HTTP_POOL_SIZE_BROADCAST = int(os.environ.get('HTTP_POOL_SIZE_BROADCAST', str(BROADCAST_CONCURRENCY)))
+# Сколько секунд ждать свободного соединения в пуле
+HTTP_POOL_TIMEOUT = float(os.environ.get('HTTP_POOL_TIMEOUT', '5'))
+# Сколько секунд держать неиспользуемое соединение открытым
+HTTP_KEEPALIVE_EXPIRY = float(os.environ.get('HTTP_KEEPALIVE_EXPIRY', '60'))
+# HTTP/2 включается, только если установлен пакет h2 (python-telegram-bot[http2])
+HTTP2_ENABLED = os.environ.get('HTTP2', '1') == '1' and importlib.util.find_spec('h2') is not None
+# По HTTP/2 одно соединение несет много запросов сразу; столько одновременных запросов
+# на соединение разрешает PooledRequest (типичное ограничение серверов - 100 потоков)
+HTTP2_STREAMS_PER_CONNECTION = int(os.environ.get('HTTP2_STREAMS_PER_CONNECTION', '100'))
+# Таймауты загрузки фото календаря (запись тела запроса и ожидание ответа)
+PHOTO_WRITE_TIMEOUT = float(os.environ.get('PHOTO_WRITE_TIMEOUT', '60'))
+PHOTO_READ_TIMEOUT = float(os.environ.get('PHOTO_READ_TIMEOUT', '30'))
+# Как часто выводить в лог статистику пулов соединений, секунд (0 - не выводить)
+HTTP_STATS_INTERVAL = int(os.environ.get('HTTP_STATS_INTERVAL', '300'))
+
+# Допустимые значения ожидаемой продолжительности жизни
+DEFAULT_LIFE_EXPECTANCY = 90
+MIN_LIFE_EXPECTANCY = 50
+MAX_LIFE_EXPECTANCY = 120
+
+# Реплики для чтения через запятую в формате host[:port] (по умолчанию чтение идет с DB_HOST)
+DB_READ_HOSTS = [host.strip() for host in os.environ.get('DB_READ_HOSTS', '').split(',') if host.strip()]
+# Сколько секунд после записи читать данные пользователя с основного сервера (read-your-writes)
+READ_YOUR_WRITES_SECONDS = float(os.environ.get('READ_YOUR_WRITES_SECONDS', '10'))
+# Через сколько секунд снова пробовать недоступную реплику
+REPLICA_RETRY_SECONDS = float(os.environ.get('REPLICA_RETRY_SECONDS', '30'))
+
 class DatabaseConnection:
     """Контекстный менеджер для работы с базой данных PostgreSQL"""
-    def __init__(self):
+    def __init__(self, host: str = None, port: str = None):
         self.conn = None
+        self.host = host or DB_HOST
+        self.port = port or DB_PORT
         
     def __enter__(self):
         try:
             self.conn = psycopg2.connect(
-                host=DB_HOST,
-                port=DB_PORT,
+                host=self.host,
+                port=self.port,
                 dbname=DB_NAME,
                 user=DB_USER,
                 password=DB_PASSWORD
@@ -64,6 +176,181 @@ def get_db_connection():
     """Создает и возвращает соединение с базой данных PostgreSQL как контекстный менеджер"""
     return DatabaseConnection()
 
+class ReadRouter:
+    """Выбирает сервер для запросов только на чтение.
+
+    Из доступных реплик выбирается наименее загруженная (по числу открытых
+    соединений), при равной загрузке - по кругу. Реплика, к которой не удалось
+    подключиться, пропускается REPLICA_RETRY_SECONDS секунд; если доступных
+    реплик нет, чтение идет с основного сервера. Данные пользователя, который
+    недавно что-то изменил, читаются с основного сервера (read-your-writes).
+    """
+    def __init__(self, hosts: list):
+        self.replicas = [tuple(host.split(':', 1)) if ':' in host else (host, DB_PORT) for host in hosts]
+        self.in_flight = [0] * len(self.replicas)
+        self.down_until = [0.0] * len(self.replicas)
+        self.next_index = 0
+        self.recent_writes = {}
+        self.lock = threading.Lock()
+
+    def mark_write(self, user_id: int):
+        """Запоминает, что пользователь только что изменил свои данные"""
+        if not self.replicas:
+            return
+        now = monotonic()
+        with self.lock:
+            if len(self.recent_writes) > 10000:
+                self.recent_writes = {
+                    key: deadline for key, deadline in self.recent_writes.items() if deadline > now
+                }
+            self.recent_writes[user_id] = now + READ_YOUR_WRITES_SECONDS
+
+    def is_sticky(self, user_id: int) -> bool:
+        with self.lock:
+            deadline = self.recent_writes.get(user_id)
+        return deadline is not None and deadline > monotonic()
+
+    def candidates(self) -> list:
+        """Возвращает индексы доступных реплик в порядке предпочтения"""
+        now = monotonic()
+        with self.lock:
+            start = self.next_index
+            self.next_index = (self.next_index + 1) % max(1, len(self.replicas))
+            available = [
+                (start + offset) % len(self.replicas)
+                for offset in range(len(self.replicas))
+                if self.down_until[(start + offset) % len(self.replicas)] <= now
+            ]
+            # sorted устойчив, поэтому при равной загрузке сохраняется порядок по кругу
+            return sorted(available, key=lambda index: self.in_flight[index])
+
+    def acquire(self, index: int):
+        with self.lock:
+            self.in_flight[index] += 1
+
+    def release(self, index: int):
+        with self.lock:
+            self.in_flight[index] -= 1
+
+    def mark_down(self, index: int):
+        with self.lock:
+            self.down_until[index] = monotonic() + REPLICA_RETRY_SECONDS
+
+READ_ROUTER = ReadRouter(DB_READ_HOSTS)
+
+class ReadConnection:
+    """Контекстный менеджер соединения только для чтения: реплика или основной сервер"""
+    def __init__(self, router: ReadRouter, user_id: int = None):
+        self.router = router
+        self.user_id = user_id
+        self.index = None
+        self.connection = None
+
+    @property
+    def on_replica(self) -> bool:
+        return self.index is not None
+
+    def __enter__(self):
+        if self.user_id is None or not self.router.is_sticky(self.user_id):
+            for index in self.router.candidates():
+                host, port = self.router.replicas[index]
+                self.router.acquire(index)
+                connection = DatabaseConnection(host, port)
+                try:
+                    conn = connection.__enter__()
+                    conn.set_session(readonly=True)
+                except psycopg2.Error as e:
+                    connection.__exit__(type(e), e, e.__traceback__)
+                    self.router.release(index)
+                    self.router.mark_down(index)
+                    logger.warning("Реплика %s:%s недоступна, пробуем следующую: %s", host, port, e)
+                    continue
+                self.index = index
+                self.connection = connection
+                return conn
+        # Реплик нет, все недоступны или нужны только что записанные данные
+        self.connection = DatabaseConnection()
+        return self.connection.__enter__()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.connection.__exit__(exc_type, exc_val, exc_tb)
+        if self.index is not None:
+            self.router.release(self.index)
+            if exc_type is not None and issubclass(exc_type, psycopg2.OperationalError):
+                # Реплика упала или оборвала соединение посреди запроса
+                self.router.mark_down(self.index)
+
+def get_read_connection(user_id: int = None):
+    """Возвращает соединение для запросов только на чтение (с учетом реплик из DB_READ_HOSTS)"""
+    return ReadConnection(READ_ROUTER, user_id)
+
+def fetch_read_only(query, params: tuple = None, user_id: int = None, one: bool = False):
+    """Выполняет запрос на чтение на реплике; если там он не удался, повторяет на основном сервере.
+
+    Возвращает fetchone() при one=True, иначе fetchall().
+    """
+    def run(conn):
+        with conn.cursor() as cursor:
+            cursor.execute(query, params)
+            return cursor.fetchone() if one else cursor.fetchall()
+
+    connection = get_read_connection(user_id)
+    try:
+        with connection as conn:
+            return run(conn)
+    except psycopg2.Error as e:
+        if not connection.on_replica:
+            raise
+        # Реплика могла упасть или отменить запрос из-за конфликта с репликацией
+        logger.warning("Запрос на реплике не выполнен, повторяем на основном сервере: %s", e)
+    with get_db_connection() as conn:
+        return run(conn)
+
+class SingleFlight:
+    """Объединяет одновременные одинаковые вычисления.
+
+    Пока вычисление с данным ключом выполняется в отдельном потоке, остальные
+    вызовы с тем же ключом не запускают его заново, а ждут тот же результат.
+    """
+    def __init__(self):
+        self.in_flight = {}
+
+    async def run(self, key, func, *args):
+        future = self.in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(asyncio.to_thread(func, *args))
+            self.in_flight[key] = future
+
+            def forget(done):
+                if self.in_flight.get(key) is done:
+                    del self.in_flight[key]
+
+            future.add_done_callback(forget)
+        # shield: отмена одного ожидающего не должна отменять вычисление для остальных
+        return await asyncio.shield(future)
+
+# Одинаковые отрисовки календаря (например, рассылка и ответ из меню одновременно)
+CALENDAR_RENDERS = SingleFlight()
+
+def fetch_user(user_id: int, columns: tuple):
+    """Читает указанные колонки пользователя из базы данных"""
+    query = sql.SQL("SELECT {} FROM users WHERE user_id = %s").format(
+        sql.SQL(", ").join(map(sql.Identifier, columns))
+    )
+    return fetch_read_only(query, (user_id,), user_id=user_id, one=True)
+
+async def load_user(user_id: int, columns: tuple):
+    """Читает профиль пользователя вне event loop"""
+    return await asyncio.to_thread(fetch_user, user_id, columns)
+
+def is_valid_birthdate(birthdate: date) -> bool:
+    """Проверяет, что дата рождения не находится в будущем"""
+    return birthdate <= date.today()
+
+def is_valid_life_expectancy(life_expectancy: int) -> bool:
+    """Проверяет, что продолжительность жизни находится в допустимом диапазоне"""
+    return MIN_LIFE_EXPECTANCY <= life_expectancy <= MAX_LIFE_EXPECTANCY
+
 def init_db():
     try:
         with get_db_connection() as conn:
@@ -87,7 +374,8 @@ def init_db():
                             name TEXT NOT NULL,
                             birthdate DATE NOT NULL,
                             life_expectancy INTEGER DEFAULT 90,
-                            notifications_enabled BOOLEAN DEFAULT TRUE
+                            notifications_enabled BOOLEAN DEFAULT TRUE,
+                            notification_mode TEXT DEFAULT 'photo'
                         )
                     """)
                     logger.info("Таблица users создана успешно")
@@ -121,6 +409,43 @@ def init_db():
                         # Добавляем колонку notifications_enabled, если она не существует
                         cursor.execute("ALTER TABLE users ADD COLUMN notifications_enabled BOOLEAN DEFAULT TRUE")
                         logger.info("Колонка notifications_enabled добавлена в таблицу users")
+                    
+                    # Проверяем, существует ли колонка notification_mode
+                    cursor.execute("""
+                        SELECT EXISTS (
+                            SELECT FROM information_schema.columns 
+                            WHERE table_name = 'users' AND column_name = 'notification_mode'
+                        );
+                    """)
+                    result = cursor.fetchone()
+                    column_exists = result[0] if result is not None else False
+                    
+                    if not column_exists:
+                        # Добавляем колонку notification_mode, если она не существует
+                        cursor.execute("ALTER TABLE users ADD COLUMN notification_mode TEXT DEFAULT 'photo'")
+                        logger.info("Колонка notification_mode добавлена в таблицу users")
+            
+            # Очередь еженедельной рассылки для распределенных воркеров
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS broadcast_queue (
+                        run_id DATE NOT NULL,
+                        user_id BIGINT NOT NULL,
+                        status TEXT NOT NULL DEFAULT 'pending',
+                        claimed_by TEXT,
+                        claimed_at TIMESTAMPTZ,
+                        attempts INTEGER NOT NULL DEFAULT 0,
+                        available_at TIMESTAMPTZ,
+                        PRIMARY KEY (run_id, user_id)
+                    )
+                """)
+                # Колонка available_at появилась позже - добавляем в уже созданную очередь
+                cursor.execute("ALTER TABLE broadcast_queue ADD COLUMN IF NOT EXISTS available_at TIMESTAMPTZ")
+                cursor.execute("""
+                    CREATE INDEX IF NOT EXISTS broadcast_queue_open
+                    ON broadcast_queue (run_id, user_id)
+                    WHERE status IN ('pending', 'claimed')
+                """)
             
             logger.info(f"База данных PostgreSQL инициализирована успешно")
     except psycopg2.Error as e:
@@ -133,14 +458,51 @@ except Exception as e:
     logger.critical(f"Критическая ошибка при запуске: {e}")
     # В реальном приложении здесь можно добавить уведомление администратора
 
+def build_keyboard(rows: list) -> str:
+    """Создает клавиатуру и возвращает ее сериализованный JSON.
+
+    Клавиатуры меню не меняются, поэтому строятся один раз при запуске.
+    Строковые параметры python-telegram-bot передает в Bot API без повторной
+    сериализации, так что готовый JSON можно использовать как reply_markup.
+    """
+    keyboard = [[KeyboardButton(text) for text in row] for row in rows]
+    return ReplyKeyboardMarkup(keyboard, resize_keyboard=True).to_json()
+
+MAIN_MENU_KEYBOARD = build_keyboard([
+    ["📝 Регистрация", "📊 Моя статистика"],
+    ["📅 Календарь жизни", "✏️ Изменить данные"],
+    ["ℹ️ О боте"]
+])
+PROFILE_MENU_KEYBOARD = build_keyboard([
+    ["✏️ Изменить имя", "📅 Изменить дату рождения"],
+    ["⏳ Изменить продолжительность жизни"],
+    ["🔔 Управление уведомлениями", "🖼 Формат уведомлений"],
+    ["❌ Удалить профиль"],
+    ["🔙 Назад в меню"]
+])
+LIFE_EXPECTANCY_KEYBOARD = build_keyboard([
+    ["70 лет", "80 лет", "90 лет"],
+    ["Другое значение"],
+    ["🔙 Назад"]
+])
+# Клавиатуры управления уведомлениями по текущему состоянию (предлагают противоположное действие)
+NOTIFICATIONS_KEYBOARDS = {
+    True: build_keyboard([["Отключить уведомления"], ["🔙 Назад"]]),
+    False: build_keyboard([["Включить уведомления"], ["🔙 Назад"]])
+}
+NOTIFICATION_MODE_KEYBOARD = build_keyboard([
+    ["🖼 Текст с календарем", "📝 Только текст"],
+    ["🔙 Назад"]
+])
+DELETE_PROFILE_KEYBOARD = build_keyboard([
+    ["✅ Да, удалить профиль"],
+    ["❌ Нет, отменить"]
+])
+REMOVE_KEYBOARD = ReplyKeyboardRemove().to_json()
+
 def get_main_menu_keyboard():
-    """Создает клавиатуру основного меню"""
-    keyboard = [
-        [KeyboardButton("📝 Регистрация"), KeyboardButton("📊 Моя статистика")],
-        [KeyboardButton("📅 Календарь жизни"), KeyboardButton("✏️ Изменить данные")],
-        [KeyboardButton("ℹ️ О боте")]
-    ]
-    return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+    """Возвращает клавиатуру основного меню"""
+    return MAIN_MENU_KEYBOARD
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Отправляет приветственное сообщение и показывает главное меню"""
@@ -150,32 +512,57 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     )
     return MAIN_MENU
 
+def is_repeated_menu_tap(context: ContextTypes.DEFAULT_TYPE, text: str, message_id: int) -> bool:
+    """Проверяет, что нажатие повторяет предыдущее и отправлено до ответа на него.
+
+    Обновления обрабатываются по очереди, поэтому серия быстрых нажатий доходит до бота
+    уже после ответа на первое. В личном чате сообщения пользователя и бота нумеруются
+    подряд: если между нажатиями нет ответа бота, их номера соседние.
+    """
+    previous = context.chat_data.get('last_menu_tap')
+    return (
+        previous is not None
+        and previous[0] == text
+        and message_id == previous[1] + 1
+        and monotonic() - previous[2] < MENU_DEBOUNCE_SECONDS
+    )
+
 async def main_menu_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Обрабатывает выбор пункта в главном меню"""
     text = update.message.text
-    
-    if text == "📝 Регистрация":
-        await update.message.reply_text("Как тебя зовут?")
-        return GET_NAME
-    elif text == "📊 Моя статистика":
-        return await show_statistics(update, context)
-    elif text == "📅 Календарь жизни":
-        return await show_life_calendar(update, context)
-    elif text == "✏️ Изменить данные":
-        return await edit_profile(update, context)
-    elif text == "ℹ️ О боте":
-        await update.message.reply_text(
-            "Этот бот помогает отслеживать количество прожитых недель. "
-            "Каждое воскресенье в 21:00 ты будешь получать уведомление с текстовой статистикой и календарем жизни.",
-            reply_markup=get_main_menu_keyboard()
-        )
-        return MAIN_MENU
-    else:
-        await update.message.reply_text(
-            "Пожалуйста, используй кнопки меню для навигации.",
-            reply_markup=get_main_menu_keyboard()
-        )
-        return MAIN_MENU
+    message_id = update.message.message_id
+    action = MAIN_MENU_ACTIONS.get(text)
+    if action is not None:
+        if is_repeated_menu_tap(context, text, message_id):
+            context.chat_data['last_menu_tap'] = (text, message_id, monotonic())
+            await update.message.reply_text(
+                "⏳ Ответ на это нажатие уже отправлен выше.",
+                reply_markup=get_main_menu_keyboard()
+            )
+            return MAIN_MENU
+        try:
+            return await action(update, context)
+        finally:
+            # Окно отсчитывается от окончания обработки, а не от нажатия
+            context.chat_data['last_menu_tap'] = (text, message_id, monotonic())
+
+    await update.message.reply_text(
+        "Пожалуйста, используй кнопки меню для навигации.",
+        reply_markup=get_main_menu_keyboard()
+    )
+    return MAIN_MENU
+
+async def ask_name(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    await update.message.reply_text("Как тебя зовут?")
+    return GET_NAME
+
+async def show_about(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    await update.message.reply_text(
+        "Этот бот помогает отслеживать количество прожитых недель. "
+        "Каждое воскресенье в 21:00 ты будешь получать уведомление с текстовой статистикой и календарем жизни.",
+        reply_markup=get_main_menu_keyboard()
+    )
+    return MAIN_MENU
 
 async def get_name(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     context.user_data['name'] = update.message.text
@@ -192,7 +579,7 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
 async def get_birthdate(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     try:
         birthdate = datetime.strptime(update.message.text, "%d.%m.%Y").date()
-        if birthdate > date.today():
+        if not is_valid_birthdate(birthdate):
             await update.message.reply_text("Дата рождения не может быть в будущем. Введи снова:")
             return GET_BIRTHDATE
             
@@ -208,16 +595,17 @@ async def get_birthdate(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
                         # Обновляем существующего пользователя
                         cursor.execute(
                             "UPDATE users SET name = %s, birthdate = %s, life_expectancy = %s WHERE user_id = %s",
-                            (context.user_data['name'], birthdate, 90, user_id)
+                            (context.user_data['name'], birthdate, DEFAULT_LIFE_EXPECTANCY, user_id)
                         )
                     else:
                         # Добавляем нового пользователя
                         cursor.execute(
                             "INSERT INTO users (user_id, name, birthdate, life_expectancy, notifications_enabled) VALUES (%s, %s, %s, %s, %s)",
-                            (user_id, context.user_data['name'], birthdate, 90, True)
+                            (user_id, context.user_data['name'], birthdate, DEFAULT_LIFE_EXPECTANCY, True)
                         )
                 
                 conn.commit()
+                READ_ROUTER.mark_write(user_id)
             
             await update.message.reply_text(
                 "✅ Данные сохранены! Каждое воскресенье в 21:00 ты будешь получать обновление.",
@@ -242,13 +630,7 @@ async def show_statistics(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     today = date.today()
     
     try:
-        with get_db_connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute(
-                    "SELECT name, birthdate, life_expectancy FROM users WHERE user_id = %s", 
-                    (user_id,)
-                )
-                user_data = cursor.fetchone()
+        user_data = await load_user(user_id, ("name", "birthdate", "life_expectancy"))
         
         if not user_data:
             await update.message.reply_text(
@@ -308,13 +690,9 @@ async def edit_profile(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
     user_id = update.message.from_user.id
     
     try:
-        with get_db_connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute(
-                    "SELECT name, birthdate, life_expectancy, notifications_enabled FROM users WHERE user_id = %s", 
-                    (user_id,)
-                )
-                user_data = cursor.fetchone()
+        user_data = await load_user(
+            user_id, ("name", "birthdate", "life_expectancy", "notifications_enabled", "notification_mode")
+        )
         
         if not user_data:
             await update.message.reply_text(
@@ -323,28 +701,21 @@ async def edit_profile(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
             )
             return MAIN_MENU
             
-        name, birthdate, life_expectancy, notifications_enabled = user_data
+        name, birthdate, life_expectancy, notifications_enabled, notification_mode = user_data
         # birthdate уже является объектом date в PostgreSQL
         
         notifications_status = "Включены ✅" if notifications_enabled else "Отключены ❌"
-        
-        keyboard = [
-            [KeyboardButton("✏️ Изменить имя"), KeyboardButton("📅 Изменить дату рождения")],
-            [KeyboardButton("⏳ Изменить продолжительность жизни")],
-            [KeyboardButton("🔔 Управление уведомлениями")],
-            [KeyboardButton("❌ Удалить профиль")],
-            [KeyboardButton("🔙 Назад в меню")]
-        ]
-        reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+        mode_title = NOTIFICATION_MODE_TITLES.get(notification_mode, NOTIFICATION_MODE_TITLES[NOTIFICATION_MODE_PHOTO])
         
         await update.message.reply_text(
             f"Текущие данные:\n"
             f"👤 Имя: {name}\n"
             f"📅 Дата рождения: {birthdate.strftime('%d.%m.%Y')}\n"
             f"⏳ Продолжительность жизни: {life_expectancy} лет\n"
-            f"🔔 Уведомления: {notifications_status}\n\n"
+            f"🔔 Уведомления: {notifications_status}\n"
+            f"🖼 Формат уведомлений: {mode_title}\n\n"
             f"Что хочешь изменить?",
-            reply_markup=reply_markup
+            reply_markup=PROFILE_MENU_KEYBOARD
         )
         return EDIT_PROFILE
         
@@ -358,82 +729,77 @@ async def edit_profile(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
 
 # Константы для новых состояний ConversationHandler
 MANAGE_NOTIFICATIONS, DELETE_PROFILE, CUSTOM_LIFE_EXPECTANCY = range(7, 10)
+NOTIFICATION_MODE = 10
 
 async def edit_profile_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Обрабатывает выбор в меню редактирования профиля"""
-    text = update.message.text
-    
-    if text == "✏️ Изменить имя":
-        await update.message.reply_text("Введи новое имя:")
-        return EDIT_NAME
-    elif text == "📅 Изменить дату рождения":
-        await update.message.reply_text("Введи новую дату рождения в формате ДД.ММ.ГГГГ:")
-        return EDIT_BIRTHDATE
-    elif text == "⏳ Изменить продолжительность жизни":
-        keyboard = [
-            [KeyboardButton("70 лет"), KeyboardButton("80 лет"), KeyboardButton("90 лет")],
-            [KeyboardButton("Другое значение")],
-            [KeyboardButton("🔙 Назад")]
-        ]
-        reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
-        await update.message.reply_text(
-            "Выбери ожидаемую продолжительность жизни:",
-            reply_markup=reply_markup
-        )
-        return EDIT_LIFE_EXPECTANCY
-    elif text == "🔔 Управление уведомлениями":
-        user_id = update.message.from_user.id
-        try:
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute(
-                        "SELECT notifications_enabled FROM users WHERE user_id = %s", 
-                        (user_id,)
-                    )
-                    result = cursor.fetchone()
-                    notifications_enabled = result[0] if result else True
-                    
-                    # Создаем клавиатуру с противоположным действием
-                    keyboard = [[
-                        KeyboardButton("Отключить уведомления" if notifications_enabled else "Включить уведомления")
-                    ], [KeyboardButton("🔙 Назад")]]
-                    reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
-                    
-                    status = "включены" if notifications_enabled else "отключены"
-                    await update.message.reply_text(
-                        f"Сейчас уведомления {status}. Что ты хочешь сделать?",
-                        reply_markup=reply_markup
-                    )
-                    return MANAGE_NOTIFICATIONS
-        except psycopg2.Error as e:
-            logger.error(f"Ошибка при получении статуса уведомлений пользователя {user_id}: {e}")
-            await update.message.reply_text(
-                "❌ Произошла ошибка при получении данных. Пожалуйста, попробуйте позже.",
-                reply_markup=get_main_menu_keyboard()
-            )
-            return MAIN_MENU
-    elif text == "❌ Удалить профиль":
-        keyboard = [
-            [KeyboardButton("✅ Да, удалить профиль")],
-            [KeyboardButton("❌ Нет, отменить")]
-        ]
-        reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+    action = PROFILE_MENU_ACTIONS.get(update.message.text)
+    if action is not None:
+        return await action(update, context)
+
+    await update.message.reply_text(
+        "Пожалуйста, используй кнопки меню для навигации."
+    )
+    return EDIT_PROFILE
+
+async def ask_new_name(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    await update.message.reply_text("Введи новое имя:")
+    return EDIT_NAME
+
+async def ask_new_birthdate(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    await update.message.reply_text("Введи новую дату рождения в формате ДД.ММ.ГГГГ:")
+    return EDIT_BIRTHDATE
+
+async def ask_life_expectancy(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    await update.message.reply_text(
+        "Выбери ожидаемую продолжительность жизни:",
+        reply_markup=LIFE_EXPECTANCY_KEYBOARD
+    )
+    return EDIT_LIFE_EXPECTANCY
+
+async def ask_notifications(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Показывает текущее состояние уведомлений и предлагает его изменить"""
+    user_id = update.message.from_user.id
+    try:
+        result = await load_user(user_id, ("notifications_enabled",))
+        notifications_enabled = result[0] if result else True
+        
+        status = "включены" if notifications_enabled else "отключены"
         await update.message.reply_text(
-            "⚠️ Ты уверен, что хочешь удалить свой профиль? Все данные будут безвозвратно удалены.",
-            reply_markup=reply_markup
+            f"Сейчас уведомления {status}. Что ты хочешь сделать?",
+            reply_markup=NOTIFICATIONS_KEYBOARDS[bool(notifications_enabled)]
         )
-        return DELETE_PROFILE
-    elif text == "🔙 Назад в меню":
+        return MANAGE_NOTIFICATIONS
+    except psycopg2.Error as e:
+        logger.error(f"Ошибка при получении статуса уведомлений пользователя {user_id}: {e}")
         await update.message.reply_text(
-            "Возвращаемся в главное меню.",
+            "❌ Произошла ошибка при получении данных. Пожалуйста, попробуйте позже.",
             reply_markup=get_main_menu_keyboard()
         )
         return MAIN_MENU
-    else:
-        await update.message.reply_text(
-            "Пожалуйста, используй кнопки меню для навигации."
-        )
-        return EDIT_PROFILE
+
+async def ask_notification_mode(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    await update.message.reply_text(
+        "Как присылать еженедельное уведомление?\n"
+        "🖼 Текст с календарем - статистика в подписи к картинке календаря\n"
+        "📝 Только текст - без картинки",
+        reply_markup=NOTIFICATION_MODE_KEYBOARD
+    )
+    return NOTIFICATION_MODE
+
+async def ask_delete_profile(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    await update.message.reply_text(
+        "⚠️ Ты уверен, что хочешь удалить свой профиль? Все данные будут безвозвратно удалены.",
+        reply_markup=DELETE_PROFILE_KEYBOARD
+    )
+    return DELETE_PROFILE
+
+async def back_to_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    await update.message.reply_text(
+        "Возвращаемся в главное меню.",
+        reply_markup=get_main_menu_keyboard()
+    )
+    return MAIN_MENU
 
 async def edit_name(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Обновляет имя пользователя"""
@@ -448,6 +814,7 @@ async def edit_name(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
                     (new_name, user_id)
                 )
             conn.commit()
+            READ_ROUTER.mark_write(user_id)
         
         await update.message.reply_text(
             f"✅ Имя успешно изменено на '{new_name}'!",
@@ -467,7 +834,7 @@ async def edit_birthdate(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     """Обновляет дату рождения пользователя"""
     try:
         new_birthdate = datetime.strptime(update.message.text, "%d.%m.%Y").date()
-        if new_birthdate > date.today():
+        if not is_valid_birthdate(new_birthdate):
             await update.message.reply_text("Дата рождения не может быть в будущем. Введи снова:")
             return EDIT_BIRTHDATE
             
@@ -480,6 +847,7 @@ async def edit_birthdate(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                         (new_birthdate, user_id)
                     )
                 conn.commit()
+                READ_ROUTER.mark_write(user_id)
             
             await update.message.reply_text(
                 f"✅ Дата рождения успешно изменена на {new_birthdate.strftime('%d.%m.%Y')}!",
@@ -509,7 +877,7 @@ async def edit_life_expectancy(update: Update, context: ContextTypes.DEFAULT_TYP
     if text == "Другое значение":
         await update.message.reply_text(
             "Введи желаемую продолжительность жизни (целое число от 50 до 120):",
-            reply_markup=ReplyKeyboardRemove()
+            reply_markup=REMOVE_KEYBOARD
         )
         return CUSTOM_LIFE_EXPECTANCY
     
@@ -519,15 +887,9 @@ async def edit_life_expectancy(update: Update, context: ContextTypes.DEFAULT_TYP
         
         # Проверяем, что значение находится в допустимом диапазоне
         if new_life_expectancy not in [70, 80, 90]:
-            keyboard = [
-                [KeyboardButton("70 лет"), KeyboardButton("80 лет"), KeyboardButton("90 лет")],
-                [KeyboardButton("Другое значение")],
-                [KeyboardButton("🔙 Назад")]
-            ]
-            reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
             await update.message.reply_text(
                 "❌ Пожалуйста, выбери одно из предложенных значений или 'Другое значение'.",
-                reply_markup=reply_markup
+                reply_markup=LIFE_EXPECTANCY_KEYBOARD
             )
             return EDIT_LIFE_EXPECTANCY
             
@@ -540,6 +902,7 @@ async def edit_life_expectancy(update: Update, context: ContextTypes.DEFAULT_TYP
                         (new_life_expectancy, user_id)
                     )
                 conn.commit()
+                READ_ROUTER.mark_write(user_id)
             
             await update.message.reply_text(
                 f"✅ Ожидаемая продолжительность жизни успешно изменена на {new_life_expectancy} лет!",
@@ -556,15 +919,9 @@ async def edit_life_expectancy(update: Update, context: ContextTypes.DEFAULT_TYP
             return MAIN_MENU
 
     except (ValueError, IndexError):
-        keyboard = [
-            [KeyboardButton("70 лет"), KeyboardButton("80 лет"), KeyboardButton("90 лет")],
-            [KeyboardButton("Другое значение")],
-            [KeyboardButton("🔙 Назад")]
-        ]
-        reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
         await update.message.reply_text(
             "❌ Пожалуйста, выбери одно из предложенных значений или 'Другое значение'.",
-            reply_markup=reply_markup
+            reply_markup=LIFE_EXPECTANCY_KEYBOARD
         )
         return EDIT_LIFE_EXPECTANCY
 
@@ -574,7 +931,7 @@ async def custom_life_expectancy(update: Update, context: ContextTypes.DEFAULT_T
         new_life_expectancy = int(update.message.text)
         
         # Проверяем, что значение находится в разумном диапазоне
-        if new_life_expectancy < 50 or new_life_expectancy > 120:
+        if not is_valid_life_expectancy(new_life_expectancy):
             await update.message.reply_text(
                 "❌ Пожалуйста, введи значение от 50 до 120 лет:"
             )
@@ -589,6 +946,7 @@ async def custom_life_expectancy(update: Update, context: ContextTypes.DEFAULT_T
                         (new_life_expectancy, user_id)
                     )
                 conn.commit()
+                READ_ROUTER.mark_write(user_id)
             
             await update.message.reply_text(
                 f"✅ Ожидаемая продолжительность жизни успешно изменена на {new_life_expectancy} лет!",
@@ -610,92 +968,162 @@ async def custom_life_expectancy(update: Update, context: ContextTypes.DEFAULT_T
         )
         return CUSTOM_LIFE_EXPECTANCY
 
-def generate_life_calendar(birthdate: date, life_expectancy: int) -> io.BytesIO:
-    """Генерирует изображение календаря жизни"""
-    # Константы для изображения
-    CELL_SIZE = 10  # Размер одной ячейки в пикселях
-    WEEKS_PER_ROW = 52  # Количество недель в году (по горизонтали)
-    YEARS = life_expectancy  # Количество лет (по вертикали)
+# Варианты календаря: количество ячеек в строке, лет в одной строке, подпись по горизонтали
+# и шаг подписей по горизонтали
+CALENDAR_LAYOUTS = {
+    "weeks": {"per_row": 52, "years_per_row": 1, "title": "Недели ——>", "label_step": 5, "cell": "прожитая неделя"},
+    "months": {"per_row": 12, "years_per_row": 1, "title": "Месяцы ——>", "label_step": 3, "cell": "прожитый месяц"},
+    "years": {"per_row": 10, "years_per_row": 10, "title": "Годы ——>", "label_step": 5, "cell": "прожитый год"},
+}
+# Размер ячейки по умолчанию (полноразмерный календарь)
+CALENDAR_CELL_SIZE = 10
+# При ячейках меньше этого размера подписи не помещаются и не рисуются
+CALENDAR_MIN_LABELED_CELL_SIZE = 8
+# Telegram не принимает фото, у которых сумма ширины и высоты больше этого значения
+TELEGRAM_PHOTO_MAX_DIMENSIONS = 10000
+# Количество закэшированных вариантов изображения
+CALENDAR_CACHE_SIZE = int(os.environ.get('CALENDAR_CACHE_SIZE', '256'))
+
+@lru_cache(maxsize=1)
+def get_calendar_font():
+    """Загружает шрифт для подписей календаря один раз"""
+    # Пытаемся загрузить шрифт, если не получается, используем шрифт по умолчанию
+    try:
+        return ImageFont.truetype("Arial", 12)
+    except IOError:
+        return ImageFont.load_default()
+
+def calendar_units_lived(birthdate: date, layout: str) -> int:
+    """Возвращает количество прожитых единиц (недель, месяцев или лет) для варианта календаря"""
+    today = date.today()
+    if layout == "weeks":
+        return (today - birthdate).days // 7
+    delta = relativedelta(today, birthdate)
+    if layout == "months":
+        return delta.years * 12 + delta.months
+    return delta.years
+
+def calendar_cell_size(layout: str, life_expectancy: int, max_width: int, max_height: int = None) -> int:
+    """Подбирает размер ячейки, при котором календарь помещается в заданные ширину и высоту"""
+    params = CALENDAR_LAYOUTS[layout]
+    per_row = params["per_row"]
+    rows = -(-life_expectancy // params["years_per_row"])  # Округление вверх
+
+    def fit(margins: int) -> int:
+        # margins - сумма отступов по каждой из сторон (с подписями 50 + 20, без них 5 + 5)
+        size = min(
+            (max_width - margins) // per_row,
+            (TELEGRAM_PHOTO_MAX_DIMENSIONS - 2 * margins) // (per_row + rows)
+        )
+        if max_height is not None:
+            size = min(size, (max_height - margins) // rows)
+        return size
+
+    cell_size = fit(70)
+    if cell_size >= CALENDAR_MIN_LABELED_CELL_SIZE:
+        return cell_size
+    # Подписи не помещаются - рисуем без них, но ячейки не крупнее минимальных подписанных
+    return max(1, min(fit(10), CALENDAR_MIN_LABELED_CELL_SIZE - 1))
+
+@lru_cache(maxsize=CALENDAR_CACHE_SIZE)
+def render_calendar_png(units_lived: int, life_expectancy: int, layout: str, cell_size: int) -> bytes:
+    """Рисует календарь и возвращает PNG; результат кэшируется для каждого варианта"""
+    params = CALENDAR_LAYOUTS[layout]
+    per_row = params["per_row"]
+    years_per_row = params["years_per_row"]
+    rows = -(-life_expectancy // years_per_row)  # Округление вверх
+    total_cells = life_expectancy * per_row // years_per_row
+    labeled = cell_size >= CALENDAR_MIN_LABELED_CELL_SIZE
     
     # Отступы и размеры подписей
-    MARGIN_LEFT = 50  # Отступ слева для подписей лет
-    MARGIN_TOP = 50   # Отступ сверху для подписей недель
+    margin_left = 50 if labeled else 5
+    margin_top = 50 if labeled else 5
+    margin_end = 20 if labeled else 5
     
     # Рассчитываем размер изображения
-    width = MARGIN_LEFT + WEEKS_PER_ROW * CELL_SIZE + 20  # Добавляем отступ справа
-    height = MARGIN_TOP + YEARS * CELL_SIZE + 20  # Добавляем отступ снизу
+    width = margin_left + per_row * cell_size + margin_end
+    height = margin_top + rows * cell_size + margin_end
     
     # Создаем новое изображение с белым фоном
     image = Image.new('RGB', (width, height), color='white')
     draw = ImageDraw.Draw(image)
     
-    # Пытаемся загрузить шрифт, если не получается, используем шрифт по умолчанию
-    try:
-        font = ImageFont.truetype("Arial", 12)
-    except IOError:
-        font = ImageFont.load_default()
-    
-    # Рисуем заголовки
-    draw.text((MARGIN_LEFT, 10), "Недели ——>", fill="black", font=font)
-    draw.text((10, MARGIN_TOP), "В\nо\nз\nр\nа\nс\nт\n\n|", fill="black", font=font)
-    draw.text((10, MARGIN_TOP + 100), "↓", fill="black", font=font)
-    
-    # Рисуем подписи недель (по 5)
-    for i in range(0, WEEKS_PER_ROW + 1, 5):
-        x = MARGIN_LEFT + i * CELL_SIZE
-        draw.text((x, 30), str(i), fill="black", font=font)
-    
-    # Рисуем подписи лет (по 5)
-    for i in range(0, YEARS + 1, 5):
-        y = MARGIN_TOP + i * CELL_SIZE
-        draw.text((20, y), str(i), fill="black", font=font)
-    
-    # Рисуем сетку и заполняем прожитые недели
-    today = date.today()
-    total_weeks_lived = (today - birthdate).days // 7
+    if labeled:
+        font = get_calendar_font()
+        
+        # Рисуем заголовки
+        draw.text((margin_left, 10), params["title"], fill="black", font=font)
+        draw.text((10, margin_top), "В\nо\nз\nр\nа\nс\nт\n\n|", fill="black", font=font)
+        draw.text((10, margin_top + 100), "↓", fill="black", font=font)
+        
+        # Рисуем подписи по горизонтали
+        for i in range(0, per_row + 1, params["label_step"]):
+            x = margin_left + i * cell_size
+            draw.text((x, 30), str(i), fill="black", font=font)
+        
+        # Рисуем подписи лет (по 5)
+        for year in range(0, life_expectancy + 1, 5):
+            if year % years_per_row:
+                continue
+            y = margin_top + year // years_per_row * cell_size
+            draw.text((20, y), str(year), fill="black", font=font)
     
-    for year in range(YEARS):
-        for week in range(WEEKS_PER_ROW):
-            x = MARGIN_LEFT + week * CELL_SIZE
-            y = MARGIN_TOP + year * CELL_SIZE
-            
-            # Индекс текущей недели
-            current_week_index = year * WEEKS_PER_ROW + week
-            
-            # Определяем цвет ячейки
-            if current_week_index < total_weeks_lived:
-                # Прожитая неделя - красная
-                cell_color = 'red'
-            else:
-                # Будущая неделя - контур
-                cell_color = 'lightgray'
-            
-            # Рисуем ячейку
-            draw.rectangle(
-                [(x, y), (x + CELL_SIZE - 1, y + CELL_SIZE - 1)],
-                outline='gray',
-                fill=cell_color if current_week_index < total_weeks_lived else None
-            )
+    # Рисуем сетку и заполняем прожитые ячейки
+    for index in range(total_cells):
+        x = margin_left + index % per_row * cell_size
+        y = margin_top + index // per_row * cell_size
+        
+        # Прожитая ячейка - красная, будущая - контур
+        draw.rectangle(
+            [(x, y), (x + cell_size - 1, y + cell_size - 1)],
+            outline='gray',
+            fill='red' if index < units_lived else None
+        )
     
-    # Сохраняем изображение в байтовый поток
+    # Сохраняем изображение в байты
     img_byte_arr = io.BytesIO()
     image.save(img_byte_arr, format='PNG')
-    img_byte_arr.seek(0)  # Перемещаем указатель в начало потока
-    
-    return img_byte_arr
+    return img_byte_arr.getvalue()
+
+def calendar_render_key(birthdate: date, life_expectancy: int, layout: str,
+                        cell_size: int, max_width: int = None, max_height: int = None) -> tuple:
+    """Возвращает аргументы render_calendar_png, однозначно определяющие изображение"""
+    if layout not in CALENDAR_LAYOUTS:
+        raise ValueError(f"Неизвестный вариант календаря: {layout}")
+    if max_width is not None:
+        cell_size = calendar_cell_size(layout, life_expectancy, max_width, max_height)
+    return calendar_units_lived(birthdate, layout), life_expectancy, layout, cell_size
+
+def render_life_calendar(birthdate: date, life_expectancy: int, layout: str = "weeks",
+                         cell_size: int = CALENDAR_CELL_SIZE, max_width: int = None,
+                         max_height: int = None) -> io.BytesIO:
+    """Генерирует изображение календаря жизни в заданном варианте и размере.
+
+    layout - "weeks", "months" или "years" (что обозначает одна ячейка);
+    max_width - если указан, размер ячейки подбирается под эту ширину в пикселях
+    (и под max_height, если указана и она).
+    """
+    key = calendar_render_key(birthdate, life_expectancy, layout, cell_size, max_width, max_height)
+    return io.BytesIO(render_calendar_png(*key))
+
+async def render_life_calendar_async(birthdate: date, life_expectancy: int, layout: str = "weeks",
+                                     cell_size: int = CALENDAR_CELL_SIZE, max_width: int = None,
+                                     max_height: int = None) -> io.BytesIO:
+    """То же, что render_life_calendar, но рисует вне event loop и объединяет одинаковые отрисовки"""
+    key = calendar_render_key(birthdate, life_expectancy, layout, cell_size, max_width, max_height)
+    png = await CALENDAR_RENDERS.run(key, render_calendar_png, *key)
+    return io.BytesIO(png)
+
+def generate_life_calendar(birthdate: date, life_expectancy: int) -> io.BytesIO:
+    """Генерирует полноразмерное изображение календаря жизни (по неделям)"""
+    return render_life_calendar(birthdate, life_expectancy)
 
 async def show_life_calendar(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Показывает календарь жизни пользователя"""
     user_id = update.message.from_user.id
     
     try:
-        with get_db_connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute(
-                    "SELECT name, birthdate, life_expectancy FROM users WHERE user_id = %s", 
-                    (user_id,)
-                )
-                user_data = cursor.fetchone()
+        user_data = await load_user(user_id, ("name", "birthdate", "life_expectancy"))
         
         if not user_data:
             await update.message.reply_text(
@@ -708,11 +1136,13 @@ async def show_life_calendar(update: Update, context: ContextTypes.DEFAULT_TYPE)
         # birthdate уже является объектом date в PostgreSQL
         
         # Генерируем календарь жизни
-        calendar_image = generate_life_calendar(birthdate, life_expectancy)
+        calendar_image = await render_life_calendar_async(birthdate, life_expectancy)
         
         # Отправляем изображение
         await update.message.reply_photo(
             photo=calendar_image,
+            write_timeout=PHOTO_WRITE_TIMEOUT,
+            read_timeout=PHOTO_READ_TIMEOUT,
             caption=f"📅 Календарь жизни для {name}\n\nКаждый красный квадрат - прожитая неделя.\nВсего прожито: {(date.today() - birthdate).days // 7} недель.",
             reply_markup=get_main_menu_keyboard()
         )
@@ -726,57 +1156,212 @@ async def show_life_calendar(update: Update, context: ContextTypes.DEFAULT_TYPE)
         )
         return MAIN_MENU
 
+def broadcast_calendar_caption(layout: str) -> str:
+    """Подпись к календарю в рассылке: что обозначает одна ячейка, зависит от варианта"""
+    return f"📅 Твой календарь жизни. Каждый красный квадрат - {CALENDAR_LAYOUTS[layout]['cell']}."
+
+def check_broadcast_calendar_layout() -> bool:
+    """Проверяет при запуске вариант календаря для рассылки, чтобы не узнать об ошибке в воскресенье"""
+    if BROADCAST_CALENDAR_LAYOUT in CALENDAR_LAYOUTS:
+        return True
+    logger.critical(
+        "Ошибка: BROADCAST_CALENDAR_LAYOUT=%s, допустимые значения: %s",
+        BROADCAST_CALENDAR_LAYOUT, ", ".join(CALENDAR_LAYOUTS)
+    )
+    return False
+
+def fits_caption(text: str) -> bool:
+    """Проверяет, помещается ли текст в подпись к фото (Telegram считает длину в UTF-16)"""
+    return len(text.encode('utf-16-le')) // 2 <= MessageLimit.CAPTION_LENGTH
+
+class BroadcastStats:
+    """Счетчики рассылки вместо построчного лога по каждому пользователю"""
+    def __init__(self):
+        self.counts = Counter()
+
+    def error(self, kind: str, message: str, user_id: int, error: Exception):
+        # Построчно выводятся только первые BROADCAST_LOG_SAMPLE ошибок каждого типа
+        self.counts[kind] += 1
+        if self.counts[kind] <= BROADCAST_LOG_SAMPLE:
+            logger.error(message, user_id, error)
+
+    def log_summary(self, title: str, total: int):
+        stats = self.counts
+        suppressed = sum(
+            count - BROADCAST_LOG_SAMPLE
+            for kind, count in stats.items()
+            if kind.endswith('_errors') and count > BROADCAST_LOG_SAMPLE
+        )
+        logger.info(
+            "%s: всего %d, отправлено %d, пропущено %d, запросов к API %d, "
+            "временных ошибок %d, ошибок БД %d, Telegram %d, ввода/вывода %d, прочих %d (не выведено в лог: %d)",
+            title, total, stats['sent'], stats['skipped'], stats['api_calls'],
+            stats['retry_errors'], stats['db_errors'], stats['telegram_errors'], stats['io_errors'],
+            stats['other_errors'], suppressed
+        )
+
+class BroadcastPacer:
+    """Общая пауза для всех одновременных отправок рассылки после ответа 429.
+
+    Telegram ограничивает частоту для бота целиком, поэтому ждать должны все отправки, а не одна.
+    """
+    def __init__(self):
+        self.resume_at = 0.0
+
+    def pause(self, seconds: float):
+        self.resume_at = max(self.resume_at, monotonic() + seconds)
+
+    async def wait(self):
+        delay = self.resume_at - monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+async def run_concurrently(items, handler, concurrency: int) -> None:
+    """Обрабатывает items не более чем concurrency задачами одновременно.
+
+    Задачи берут элементы из общего итератора, поэтому корутины не создаются
+    заранее для каждого пользователя.
+    """
+    iterator = iter(items)
+
+    async def worker():
+        for item in iterator:
+            await handler(item)
+
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+
+# Результаты доставки уведомления (совпадают со статусами задач broadcast_queue,
+# кроме retry - временной ошибки, после которой отправку стоит повторить)
+DELIVERY_DONE = 'done'
+DELIVERY_RETRY = 'retry'
+DELIVERY_FAILED = 'failed'
+
+async def deliver_weekly_update(bot: Bot, user_data: tuple, today: date, stats: BroadcastStats) -> tuple:
+    """Отправляет еженедельное уведомление одному пользователю.
+
+    Возвращает (результат, пауза в секундах до повтора, которую запросил Telegram).
+    """
+    user_id, name, birthdate, life_expectancy, notifications_enabled, notification_mode = user_data
+    
+    # Пропускаем пользователей, отключивших уведомления
+    if not notifications_enabled:
+        stats.counts['skipped'] += 1
+        logger.debug("Пропускаем отправку уведомления пользователю %s, т.к. уведомления отключены", user_id)
+        return DELIVERY_DONE, 0
+        
+    try:
+        # Используем dateutil для более точных расчетов
+        delta = relativedelta(today, birthdate)
+        weeks = (today - birthdate).days // 7
+        
+        # Расчет оставшегося времени с учетом високосных лет
+        remaining_delta = relativedelta(years=life_expectancy) - delta
+        remaining_years = remaining_delta.years
+        
+        text = f"📅 Здравствуй, {name}! Ты прожил {weeks} недель. При ожидаемой продолжительности жизни {life_expectancy} лет, тебе осталось примерно {remaining_years} лет."
+        
+        if notification_mode == NOTIFICATION_MODE_TEXT:
+            # Пользователь выбрал уведомления без картинки - календарь не рисуем
+            await bot.send_message(chat_id=user_id, text=text)
+            stats.counts['api_calls'] += 1
+        else:
+            # Генерируем компактный календарь жизни
+            calendar_image = await render_life_calendar_async(
+                birthdate, life_expectancy,
+                layout=BROADCAST_CALENDAR_LAYOUT, max_width=BROADCAST_CALENDAR_WIDTH,
+                max_height=BROADCAST_CALENDAR_HEIGHT
+            )
+            calendar_caption = broadcast_calendar_caption(BROADCAST_CALENDAR_LAYOUT)
+            caption = f"{text}\n\n{calendar_caption}"
+            if fits_caption(caption):
+                # Статистика и календарь одним запросом
+                await bot.send_photo(
+                    chat_id=user_id,
+                    photo=calendar_image,
+                    caption=caption,
+                    write_timeout=PHOTO_WRITE_TIMEOUT,
+                    read_timeout=PHOTO_READ_TIMEOUT
+                )
+                stats.counts['api_calls'] += 1
+            else:
+                await bot.send_message(chat_id=user_id, text=text)
+                stats.counts['api_calls'] += 1
+                try:
+                    await bot.send_photo(
+                        chat_id=user_id,
+                        photo=calendar_image,
+                        caption=calendar_caption,
+                        write_timeout=PHOTO_WRITE_TIMEOUT,
+                        read_timeout=PHOTO_READ_TIMEOUT
+                    )
+                except TelegramError as e:
+                    # Текст уже доставлен: повтор всей доставки прислал бы его второй раз,
+                    # поэтому уведомление считается отправленным без календаря
+                    stats.error('telegram_errors', "Календарь не отправлен пользователю %s после текста: %s", user_id, e)
+                    return DELIVERY_DONE, e.retry_after if isinstance(e, RetryAfter) else 0
+                stats.counts['api_calls'] += 1
+        stats.counts['sent'] += 1
+        return DELIVERY_DONE, 0
+    except RetryAfter as e:
+        stats.error('retry_errors', "Превышен лимит Telegram при отправке пользователю %s: %s", user_id, e)
+        return DELIVERY_RETRY, e.retry_after
+    except NetworkError as e:
+        # TimedOut - подкласс NetworkError
+        stats.error('retry_errors', "Сетевая ошибка при отправке пользователю %s: %s", user_id, e)
+        return DELIVERY_RETRY, 0
+    except psycopg2.Error as e:
+        stats.error('db_errors', "Ошибка базы данных для пользователя %s: %s", user_id, e)
+    except TelegramError as e:
+        stats.error('telegram_errors', "Ошибка Telegram для пользователя %s: %s", user_id, e)
+    except IOError as e:
+        stats.error('io_errors', "Ошибка ввода/вывода для пользователя %s: %s", user_id, e)
+    except Exception as e:
+        stats.error('other_errors', "Непредвиденная ошибка для пользователя %s: %s", user_id, e)
+    return DELIVERY_FAILED, 0
+
 async def send_weekly_update(context: ContextTypes.DEFAULT_TYPE):
     today = date.today()
     
+    if BROADCAST_MODE == 'queue':
+        # Отправкой занимаются воркеры, здесь только формируем очередь
+        try:
+            queued = await asyncio.to_thread(enqueue_weekly_broadcast, today)
+            logger.info("В очередь рассылки %s добавлено пользователей: %d", today, queued)
+        except psycopg2.Error as e:
+            logger.error("Ошибка при формировании очереди рассылки: %s", e)
+        return
+    
+    # Рассылка идет через отдельный бот со своим пулом соединений (см. main),
+    # чтобы загрузки фото не занимали соединения для ответов пользователям
+    bot = context.job.data if context.job and context.job.data else context.bot
+    
     try:
-        with get_db_connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute("SELECT user_id, name, birthdate, life_expectancy, notifications_enabled FROM users")
-                users = cursor.fetchall()
+        # Полная выборка (а при сбое реплики - повтор на основном сервере) идет в отдельном
+        # потоке, чтобы не останавливать обработку сообщений пользователей
+        users = await asyncio.to_thread(
+            fetch_read_only,
+            "SELECT user_id, name, birthdate, life_expectancy, notifications_enabled, notification_mode FROM users"
+        )
     except psycopg2.Error as e:
-        logger.error(f"Ошибка при получении данных пользователей: {e}")
+        logger.error("Ошибка при получении данных пользователей: %s", e)
         return
 
-    for user_data in users:
-        user_id, name, birthdate, life_expectancy, notifications_enabled = user_data
-        
-        # Пропускаем пользователей, отключивших уведомления
-        if not notifications_enabled:
-            logger.info(f"Пропускаем отправку уведомления пользователю {user_id} ({name}), т.к. уведомления отключены")
-            continue
-            
-        try:
-            # Используем dateutil для более точных расчетов
-            delta = relativedelta(today, birthdate)
-            weeks = (today - birthdate).days // 7
-            years = delta.years
-            
-            # Расчет оставшегося времени с учетом високосных лет
-            remaining_delta = relativedelta(years=life_expectancy) - delta
-            remaining_years = remaining_delta.years
-            
-            # Отправляем текстовое сообщение
-            await context.bot.send_message(
-                chat_id=user_id,
-                text=f"📅 Здравствуй, {name}! Ты прожил {weeks} недель. При ожидаемой продолжительности жизни {life_expectancy} лет, тебе осталось примерно {remaining_years} лет."
-            )
-            
-            # Генерируем и отправляем календарь жизни
-            calendar_image = generate_life_calendar(birthdate, life_expectancy)
-            await context.bot.send_photo(
-                chat_id=user_id,
-                photo=calendar_image,
-                caption=f"📅 Твой календарь жизни. Каждый красный квадрат - прожитая неделя."
-            )
-        except psycopg2.Error as e:
-            logger.error(f"Ошибка базы данных для пользователя {user_id}: {e}")
-        except telegram.error.TelegramError as e:
-            logger.error(f"Ошибка Telegram для пользователя {user_id}: {e}")
-        except IOError as e:
-            logger.error(f"Ошибка ввода/вывода для пользователя {user_id}: {e}")
-        except Exception as e:
-            logger.error(f"Непредвиденная ошибка для пользователя {user_id}: {str(e)}")
+    stats = BroadcastStats()
+    pacer = BroadcastPacer()
+
+    async def deliver(user_data: tuple):
+        for attempt in range(1, BROADCAST_MAX_ATTEMPTS + 1):
+            await pacer.wait()
+            status, retry_after = await deliver_weekly_update(bot, user_data, today, stats)
+            if retry_after:
+                pacer.pause(retry_after)
+            # Без очереди повторяем только 429: Telegram сам называет паузу,
+            # а ждать экспоненциальную паузу после сетевой ошибки значит задержать всех остальных
+            if status != DELIVERY_RETRY or not retry_after:
+                break
+
+    await run_concurrently(users, deliver, BROADCAST_CONCURRENCY)
+    stats.log_summary("Еженедельная рассылка завершена", len(users))
 
 async def manage_notifications(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Обрабатывает включение/отключение уведомлений"""
@@ -797,6 +1382,7 @@ async def manage_notifications(update: Update, context: ContextTypes.DEFAULT_TYP
                     (new_state, user_id)
                 )
             conn.commit()
+            READ_ROUTER.mark_write(user_id)
         
         status = "включены" if new_state else "отключены"
         await update.message.reply_text(
@@ -813,6 +1399,50 @@ async def manage_notifications(update: Update, context: ContextTypes.DEFAULT_TYP
         )
         return MAIN_MENU
 
+async def manage_notification_mode(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Обрабатывает выбор формата еженедельного уведомления"""
+    text = update.message.text
+    user_id = update.message.from_user.id
+    
+    if text == "🔙 Назад":
+        return await edit_profile(update, context)
+    
+    modes = {
+        "🖼 Текст с календарем": NOTIFICATION_MODE_PHOTO,
+        "📝 Только текст": NOTIFICATION_MODE_TEXT,
+    }
+    new_mode = modes.get(text)
+    if new_mode is None:
+        await update.message.reply_text(
+            "⚠️ Пожалуйста, выбери один из предложенных вариантов.",
+            reply_markup=NOTIFICATION_MODE_KEYBOARD
+        )
+        return NOTIFICATION_MODE
+    
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "UPDATE users SET notification_mode = %s WHERE user_id = %s",
+                    (new_mode, user_id)
+                )
+            conn.commit()
+            READ_ROUTER.mark_write(user_id)
+        
+        await update.message.reply_text(
+            f"✅ Формат уведомлений изменен: {NOTIFICATION_MODE_TITLES[new_mode]}!",
+            reply_markup=get_main_menu_keyboard()
+        )
+        return MAIN_MENU
+        
+    except psycopg2.Error as e:
+        logger.error(f"Ошибка при обновлении формата уведомлений пользователя {user_id}: {e}")
+        await update.message.reply_text(
+            "❌ Произошла ошибка при обновлении данных. Пожалуйста, попробуйте позже.",
+            reply_markup=get_main_menu_keyboard()
+        )
+        return MAIN_MENU
+
 async def delete_profile(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Обрабатывает удаление профиля пользователя"""
     text = update.message.text
@@ -831,6 +1461,7 @@ async def delete_profile(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                 with conn.cursor() as cursor:
                     cursor.execute("DELETE FROM users WHERE user_id = %s", (user_id,))
                 conn.commit()
+                READ_ROUTER.mark_write(user_id)
             
             await update.message.reply_text(
                 "✅ Твой профиль успешно удален. Если захочешь вернуться, просто зарегистрируйся снова.",
@@ -847,25 +1478,152 @@ async def delete_profile(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             return MAIN_MENU
     
     # Если пользователь ввел что-то другое
-    keyboard = [
-        [KeyboardButton("✅ Да, удалить профиль")],
-        [KeyboardButton("❌ Нет, отменить")]
-    ]
-    reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
     await update.message.reply_text(
         "⚠️ Пожалуйста, выбери один из предложенных вариантов.",
-        reply_markup=reply_markup
+        reply_markup=DELETE_PROFILE_KEYBOARD
     )
     return DELETE_PROFILE
 
+# Таблицы диспетчеризации кнопок меню: текст кнопки -> обработчик
+MAIN_MENU_ACTIONS = {
+    "📝 Регистрация": ask_name,
+    "📊 Моя статистика": show_statistics,
+    "📅 Календарь жизни": show_life_calendar,
+    "✏️ Изменить данные": edit_profile,
+    "ℹ️ О боте": show_about,
+}
+PROFILE_MENU_ACTIONS = {
+    "✏️ Изменить имя": ask_new_name,
+    "📅 Изменить дату рождения": ask_new_birthdate,
+    "⏳ Изменить продолжительность жизни": ask_life_expectancy,
+    "🔔 Управление уведомлениями": ask_notifications,
+    "🖼 Формат уведомлений": ask_notification_mode,
+    "❌ Удалить профиль": ask_delete_profile,
+    "🔙 Назад в меню": back_to_main_menu,
+}
+
+class PooledRequest(HTTPXRequest):
+    """HTTPXRequest с именованным пулом соединений и учетом времени ожидания свободного соединения.
+
+    Число одновременных запросов ограничивается семафором размером с пул, поэтому
+    время ожидания семафора и есть время ожидания соединения в пуле httpx. По HTTP/2
+    запросы мультиплексируются, и семафор допускает HTTP2_STREAMS_PER_CONNECTION
+    запросов на каждое соединение, чтобы не сводить HTTP/2 к одному запросу на соединение.
+    """
+    def __init__(self, name: str, connection_pool_size: int, **kwargs):
+        super().__init__(
+            connection_pool_size=connection_pool_size,
+            pool_timeout=HTTP_POOL_TIMEOUT,
+            http_version="2" if HTTP2_ENABLED else "1.1",
+            **kwargs
+        )
+        self.name = name
+        self.pool_size = connection_pool_size
+        self.slots = asyncio.Semaphore(
+            connection_pool_size * HTTP2_STREAMS_PER_CONNECTION if HTTP2_ENABLED else connection_pool_size
+        )
+        self.stats = Counter()
+        self.max_wait = 0.0
+
+    def _build_client(self) -> httpx.AsyncClient:
+        limits = self._client_kwargs["limits"]
+        self._client_kwargs["limits"] = httpx.Limits(
+            max_connections=limits.max_connections,
+            max_keepalive_connections=limits.max_keepalive_connections,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+        )
+        return super()._build_client()
+
+    async def do_request(self, *args, **kwargs):
+        # PTB передает pool_timeout из параметров вызова; DEFAULT_NONE означает "по умолчанию",
+        # а None - ждать без ограничения, как и в httpx
+        pool_timeout = kwargs.get('pool_timeout', HTTP_POOL_TIMEOUT)
+        if pool_timeout is not None and not isinstance(pool_timeout, (int, float)):
+            pool_timeout = HTTP_POOL_TIMEOUT
+        started = monotonic()
+        try:
+            await asyncio.wait_for(self.slots.acquire(), timeout=pool_timeout)
+        except asyncio.TimeoutError:
+            self.stats['pool_timeouts'] += 1
+            raise TimedOut(f"Pool timeout: все соединения пула {self.name} заняты")
+        wait = monotonic() - started
+        self.stats['requests'] += 1
+        self.stats['wait_ms'] += int(wait * 1000)
+        self.max_wait = max(self.max_wait, wait)
+        try:
+            return await super().do_request(*args, **kwargs)
+        finally:
+            self.slots.release()
+
+    def pop_stats(self) -> dict:
+        """Возвращает статистику ожидания соединений с прошлого вызова и сбрасывает ее"""
+        requests = self.stats['requests']
+        result = {
+            "requests": requests,
+            "avg_wait_ms": self.stats['wait_ms'] / requests if requests else 0.0,
+            "max_wait_ms": self.max_wait * 1000,
+            "pool_timeouts": self.stats['pool_timeouts'],
+        }
+        self.stats.clear()
+        self.max_wait = 0.0
+        return result
+
+def get_bot_api_urls() -> tuple:
+    """Возвращает адреса Bot API (можно переопределить, например на локальную заглушку loadtest/fake_bot_api.py)"""
+    base_url = os.environ.get('BOT_API_BASE_URL', 'https://api.telegram.org/bot')
+    base_file_url = os.environ.get('BOT_API_BASE_FILE_URL', base_url.replace('/bot', '/file/bot'))
+    return base_url, base_file_url
+
+def build_broadcast_bot(bot_token: str) -> Bot:
+    """Создает бот для рассылки с отдельным пулом соединений"""
+    base_url, base_file_url = get_bot_api_urls()
+    request = PooledRequest("broadcast", HTTP_POOL_SIZE_BROADCAST)
+    return Bot(bot_token, base_url=base_url, base_file_url=base_file_url, request=request)
+
+async def log_http_pool_stats(context: ContextTypes.DEFAULT_TYPE):
+    """Выводит в лог статистику ожидания соединений по каждому пулу"""
+    for pool in context.job.data:
+        stats = pool.pop_stats()
+        logger.info(
+            "Пул %s (%d соединений): запросов %d, среднее ожидание соединения %.1f мс, "
+            "максимальное %.1f мс, таймаутов пула %d",
+            pool.name, pool.pool_size, stats["requests"], stats["avg_wait_ms"],
+            stats["max_wait_ms"], stats["pool_timeouts"]
+        )
+
 def main() -> None:
     # Получаем токен бота из переменной окружения
     bot_token = os.environ.get('BOT_TOKEN')
     if not bot_token:
         logger.critical("Ошибка: Переменная окружения BOT_TOKEN не установлена")
         return
+    if not check_broadcast_calendar_layout():
+        return
     
-    application = Application.builder().token(bot_token).build()
+    base_url, base_file_url = get_bot_api_urls()
+    
+    updates_request = PooledRequest("updates", HTTP_POOL_SIZE_UPDATES)
+    interactive_request = PooledRequest("interactive", HTTP_POOL_SIZE_INTERACTIVE)
+    broadcast_bot = build_broadcast_bot(bot_token)
+    
+    async def post_init(application: Application) -> None:
+        await broadcast_bot.initialize()
+    
+    async def post_shutdown(application: Application) -> None:
+        await broadcast_bot.shutdown()
+    
+    application = (
+        Application.builder()
+        .token(bot_token)
+        .base_url(base_url)
+        .base_file_url(base_file_url)
+        .request(interactive_request)
+        .get_updates_request(updates_request)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
+    logger.info("HTTP/%s для запросов к Bot API", "2" if HTTP2_ENABLED else "1.1")
 
     conv_handler = ConversationHandler(
         entry_points=[CommandHandler("start", start)],
@@ -879,6 +1637,7 @@ def main() -> None:
             EDIT_LIFE_EXPECTANCY: [MessageHandler(filters.TEXT & ~filters.COMMAND, edit_life_expectancy)],
             CUSTOM_LIFE_EXPECTANCY: [MessageHandler(filters.TEXT & ~filters.COMMAND, custom_life_expectancy)],
             MANAGE_NOTIFICATIONS: [MessageHandler(filters.TEXT & ~filters.COMMAND, manage_notifications)],
+            NOTIFICATION_MODE: [MessageHandler(filters.TEXT & ~filters.COMMAND, manage_notification_mode)],
             DELETE_PROFILE: [MessageHandler(filters.TEXT & ~filters.COMMAND, delete_profile)],
         },
         fallbacks=[CommandHandler("cancel", cancel)]
@@ -889,8 +1648,424 @@ def main() -> None:
     application.add_handler(conv_handler)
     
     # Запускаем еженедельное обновление только по воскресеньям (day_of_week=6)
-    application.job_queue.run_daily(send_weekly_update, time=time(21, 0), days=(6,))
+    application.job_queue.run_daily(send_weekly_update, time=time(21, 0), days=(6,), data=broadcast_bot)
+    if HTTP_STATS_INTERVAL > 0:
+        application.job_queue.run_repeating(
+            log_http_pool_stats,
+            interval=HTTP_STATS_INTERVAL,
+            data=[updates_request, interactive_request, broadcast_bot.request]
+        )
     application.run_polling()
 
+# Колонки таблицы users в порядке, используемом при импорте и экспорте
+USER_COLUMNS = ("user_id", "name", "birthdate", "life_expectancy", "notifications_enabled", "notification_mode")
+# Сколько отклоненных строк импорта выводить в лог построчно
+IMPORT_LOG_SAMPLE = 20
+
+def parse_import_birthdate(value: str) -> date:
+    """Разбирает дату рождения из файла импорта (ГГГГ-ММ-ДД или ДД.ММ.ГГГГ)"""
+    for fmt in ("%Y-%m-%d", "%d.%m.%Y"):
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"неверный формат даты: {value!r}")
+
+def parse_import_bool(value: str) -> bool:
+    """Разбирает булево значение в формате PostgreSQL"""
+    value = value.strip().lower()
+    if value in ("", "t", "true", "1", "yes", "y"):
+        return True
+    if value in ("f", "false", "0", "no", "n"):
+        return False
+    raise ValueError(f"неверное булево значение: {value!r}")
+
+def validate_import_row(row: list) -> tuple:
+    """Проверяет строку импорта по тем же правилам, что и диалог регистрации"""
+    if len(row) == len(USER_COLUMNS) - 1:
+        # Выгрузки до появления notification_mode - формат уведомлений по умолчанию
+        row = [*row, NOTIFICATION_MODE_PHOTO]
+    if len(row) != len(USER_COLUMNS):
+        raise ValueError(f"ожидается {len(USER_COLUMNS)} колонок, получено {len(row)}")
+    user_id, name, birthdate, life_expectancy, notifications_enabled, notification_mode = row
+    user_id = int(user_id)
+    if not -2 ** 63 <= user_id < 2 ** 63:
+        # Иначе строка прервала бы весь COPY ошибкой переполнения BIGINT
+        raise ValueError(f"user_id вне диапазона BIGINT: {user_id}")
+    if not name:
+        raise ValueError("пустое имя")
+    birthdate = parse_import_birthdate(birthdate)
+    if not is_valid_birthdate(birthdate):
+        raise ValueError("дата рождения в будущем")
+    life_expectancy = int(life_expectancy) if life_expectancy else DEFAULT_LIFE_EXPECTANCY
+    if not is_valid_life_expectancy(life_expectancy):
+        raise ValueError(
+            f"продолжительность жизни вне диапазона {MIN_LIFE_EXPECTANCY}-{MAX_LIFE_EXPECTANCY}"
+        )
+    notification_mode = notification_mode.strip() or NOTIFICATION_MODE_PHOTO
+    if notification_mode not in NOTIFICATION_MODE_TITLES:
+        raise ValueError(f"неизвестный формат уведомлений: {notification_mode!r}")
+    return (
+        user_id, name, birthdate.isoformat(), life_expectancy,
+        parse_import_bool(notifications_enabled), notification_mode
+    )
+
+class ValidatedCsvStream:
+    """Файлоподобный объект для COPY FROM: валидирует CSV построчно, не загружая файл в память"""
+    def __init__(self, source):
+        self.reader = csv.reader(source)
+        self.out = io.StringIO()
+        self.writer = csv.writer(self.out, lineterminator="\n")
+        self.buffer = ""
+        self.accepted = 0
+        self.rejected = 0
+        self.exhausted = False
+
+        header = next(self.reader, None)
+        if header is not None and [column.strip() for column in header] not in (
+            list(USER_COLUMNS), list(USER_COLUMNS[:-1])
+        ):
+            # Первая строка не заголовок - обрабатываем ее как данные
+            self._write_row(header, line_num=1)
+
+    def _write_row(self, row: list, line_num: int):
+        try:
+            values = validate_import_row(row)
+        except ValueError as e:
+            self.rejected += 1
+            if self.rejected <= IMPORT_LOG_SAMPLE:
+                logger.warning("Строка %d пропущена: %s", line_num, e)
+            return
+        self.writer.writerow(values)
+        self.accepted += 1
+
+    def read(self, size: int = -1) -> str:
+        while not self.exhausted and (size < 0 or len(self.buffer) < size):
+            row = next(self.reader, None)
+            if row is None:
+                self.exhausted = True
+                break
+            self._write_row(row, self.reader.line_num)
+            self.buffer += self.out.getvalue()
+            self.out.seek(0)
+            self.out.truncate()
+        if size < 0:
+            size = len(self.buffer)
+        chunk, self.buffer = self.buffer[:size], self.buffer[size:]
+        return chunk
+
+    def readline(self, size: int = -1) -> str:
+        return self.read(size)
+
+def export_users(output, fmt: str = "csv") -> None:
+    """Выгружает таблицу users через COPY TO STDOUT"""
+    columns = ", ".join(USER_COLUMNS)
+    if fmt == "binary":
+        query = f"COPY users ({columns}) TO STDOUT WITH (FORMAT binary)"
+    else:
+        query = f"COPY users ({columns}) TO STDOUT WITH (FORMAT csv, HEADER true)"
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SET DateStyle TO ISO")
+            cursor.copy_expert(query, output)
+
+def import_users(source, fmt: str = "csv") -> int:
+    """Загружает пользователей через COPY во временную таблицу и переносит их в users (upsert)"""
+    columns = ", ".join(USER_COLUMNS)
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "CREATE TEMP TABLE users_import (LIKE users INCLUDING DEFAULTS) ON COMMIT DROP"
+            )
+            if fmt == "binary":
+                cursor.copy_expert(f"COPY users_import ({columns}) FROM STDIN WITH (FORMAT binary)", source)
+            else:
+                stream = ValidatedCsvStream(source)
+                cursor.copy_expert(f"COPY users_import ({columns}) FROM STDIN WITH (FORMAT csv)", stream)
+                logger.info("Проверено строк: принято %d, отклонено %d", stream.accepted, stream.rejected)
+
+            # Бинарный формат не проходит через ValidatedCsvStream, поэтому те же правила
+            # и значения по умолчанию дублируются на стороне базы данных. Если user_id встречается
+            # в файле несколько раз, берется последняя строка (ON CONFLICT не может обновить строку
+            # дважды); временная таблица заполняется одним COPY, поэтому порядок ctid совпадает
+            # с порядком в файле
+            cursor.execute(
+                f"""
+                INSERT INTO users ({columns})
+                SELECT DISTINCT ON (user_id) {columns} FROM (
+                    SELECT user_id, name, birthdate,
+                           COALESCE(life_expectancy, %(default_life_expectancy)s) AS life_expectancy,
+                           COALESCE(notifications_enabled, TRUE) AS notifications_enabled,
+                           COALESCE(NULLIF(notification_mode, ''), %(default_mode)s) AS notification_mode,
+                           ctid AS position
+                    FROM users_import
+                ) AS import
+                WHERE name <> '' AND birthdate <= CURRENT_DATE
+                  AND life_expectancy BETWEEN %(min_life_expectancy)s AND %(max_life_expectancy)s
+                  AND notification_mode = ANY(%(modes)s)
+                ORDER BY user_id, position DESC
+                ON CONFLICT (user_id) DO UPDATE SET
+                    name = EXCLUDED.name,
+                    birthdate = EXCLUDED.birthdate,
+                    life_expectancy = EXCLUDED.life_expectancy,
+                    notifications_enabled = EXCLUDED.notifications_enabled,
+                    notification_mode = EXCLUDED.notification_mode
+                """,
+                {
+                    'default_life_expectancy': DEFAULT_LIFE_EXPECTANCY,
+                    'default_mode': NOTIFICATION_MODE_PHOTO,
+                    'min_life_expectancy': MIN_LIFE_EXPECTANCY,
+                    'max_life_expectancy': MAX_LIFE_EXPECTANCY,
+                    'modes': list(NOTIFICATION_MODE_TITLES),
+                }
+            )
+            imported = cursor.rowcount
+        conn.commit()
+    logger.info("Импортировано пользователей: %d", imported)
+    return imported
+
+def enqueue_weekly_broadcast(run_id: date) -> int:
+    """Ставит в очередь рассылки всех пользователей с включенными уведомлениями.
+
+    Повторный вызов для того же run_id ничего не добавляет, поэтому очередь можно
+    формировать из нескольких процессов без координации.
+    """
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "DELETE FROM broadcast_queue WHERE run_id < %s::date - %s",
+                (run_id, BROADCAST_QUEUE_RETENTION_DAYS)
+            )
+            cursor.execute(
+                """
+                INSERT INTO broadcast_queue (run_id, user_id)
+                SELECT %s, user_id FROM users WHERE notifications_enabled
+                ON CONFLICT DO NOTHING
+                """,
+                (run_id,)
+            )
+            queued = cursor.rowcount
+        conn.commit()
+    return queued
+
+def claim_broadcast_batch(worker_id: str, batch_size: int) -> list:
+    """Забирает пачку задач рассылки; SKIP LOCKED не дает двум воркерам взять одну и ту же задачу.
+
+    Задачи, взятые упавшим воркером, снова становятся доступны через BROADCAST_LEASE_SECONDS,
+    пока не исчерпаны BROADCAST_MAX_ATTEMPTS попыток. Отложенные после временной ошибки
+    задачи берутся не раньше available_at.
+    """
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            # Задачи, на которых воркеры падали BROADCAST_MAX_ATTEMPTS раз, больше не выдаем
+            cursor.execute(
+                """
+                UPDATE broadcast_queue SET status = 'failed'
+                WHERE status = 'claimed' AND claimed_at < now() - make_interval(secs => %s)
+                  AND attempts >= %s
+                """,
+                (BROADCAST_LEASE_SECONDS, BROADCAST_MAX_ATTEMPTS)
+            )
+            cursor.execute(
+                """
+                WITH batch AS (
+                    SELECT run_id, user_id FROM broadcast_queue
+                    WHERE (status = 'pending' AND (available_at IS NULL OR available_at <= now()))
+                       OR (status = 'claimed' AND claimed_at < now() - make_interval(secs => %s))
+                    ORDER BY run_id, user_id
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                UPDATE broadcast_queue AS queue
+                SET status = 'claimed', claimed_by = %s, claimed_at = now(), attempts = queue.attempts + 1
+                FROM batch
+                WHERE queue.run_id = batch.run_id AND queue.user_id = batch.user_id
+                RETURNING queue.run_id, queue.user_id, queue.attempts
+                """,
+                (BROADCAST_LEASE_SECONDS, batch_size, worker_id)
+            )
+            batch = cursor.fetchall()
+        conn.commit()
+    return batch
+
+def fetch_broadcast_users(user_ids: list) -> list:
+    """Читает данные пользователей для пачки рассылки.
+
+    Очередь строится по основному серверу, а реплика может еще не знать о только что
+    зарегистрированных пользователях - тех, кого нет на реплике, дочитываем с основного.
+    """
+    query = (
+        "SELECT user_id, name, birthdate, life_expectancy, notifications_enabled, notification_mode "
+        "FROM users WHERE user_id = ANY(%s)"
+    )
+    users = fetch_read_only(query, (user_ids,))
+    found = {user_data[0] for user_data in users}
+    missing = [user_id for user_id in user_ids if user_id not in found]
+    if missing and READ_ROUTER.replicas:
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(query, (missing,))
+                users += cursor.fetchall()
+    return users
+
+def count_delayed_broadcast_tasks() -> int:
+    """Считает задачи, отложенные для повтора после временной ошибки"""
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT count(*) FROM broadcast_queue WHERE status = 'pending' AND available_at > now()")
+            return cursor.fetchone()[0]
+
+def ack_broadcast_results(worker_id: str, results: list) -> None:
+    """Подтверждает обработку задач: results - список (run_id, user_id, результат, пауза от Telegram).
+
+    После временной ошибки задача возвращается в pending с экспоненциальной паузой
+    (не короче запрошенной Telegram), а после BROADCAST_MAX_ATTEMPTS попыток помечается failed.
+    """
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.executemany(
+                """
+                UPDATE broadcast_queue SET
+                    status = CASE
+                        WHEN %(status)s <> 'retry' THEN %(status)s
+                        WHEN attempts >= %(max_attempts)s THEN 'failed'
+                        ELSE 'pending'
+                    END,
+                    available_at = CASE WHEN %(status)s = 'retry' THEN now() + make_interval(
+                        secs => greatest(%(retry_after)s, %(base)s * power(2, attempts - 1))
+                    ) END
+                WHERE run_id = %(run_id)s AND user_id = %(user_id)s
+                  AND status = 'claimed' AND claimed_by = %(worker_id)s
+                """,
+                [
+                    {
+                        'status': status, 'retry_after': retry_after, 'run_id': run_id, 'user_id': user_id,
+                        'max_attempts': BROADCAST_MAX_ATTEMPTS, 'base': BROADCAST_RETRY_BASE_SECONDS,
+                        'worker_id': worker_id,
+                    }
+                    for run_id, user_id, status, retry_after in results
+                ]
+            )
+        conn.commit()
+
+def log_broadcast_runs(worker_id: str, runs: dict) -> None:
+    """Выводит итоги воркера по каждой рассылке и сбрасывает накопленную статистику"""
+    for run_id, (stats, total) in sorted(runs.items()):
+        stats.log_summary(f"Воркер {worker_id}, рассылка {run_id}", total)
+    runs.clear()
+
+async def run_broadcast_worker(bot: Bot, batch_size: int, idle_seconds: float, once: bool) -> None:
+    """Цикл воркера рассылки: взять пачку, отправить уведомления, подтвердить.
+
+    Статистика копится по каждой рассылке (run_id) и выводится, когда очередь опустела.
+    """
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    logger.info("Воркер рассылки %s запущен", worker_id)
+    # run_id -> [статистика, число задач (каждая считается один раз, при первой попытке)]
+    runs = {}
+    pacer = BroadcastPacer()
+    async with bot:
+        try:
+            while True:
+                batch = await asyncio.to_thread(claim_broadcast_batch, worker_id, batch_size)
+                if not batch:
+                    # Итоги выводим, только когда не осталось и отложенных для повтора задач
+                    if not await asyncio.to_thread(count_delayed_broadcast_tasks):
+                        log_broadcast_runs(worker_id, runs)
+                        if once:
+                            break
+                    await asyncio.sleep(idle_seconds)
+                    continue
+                
+                users = {
+                    user_data[0]: user_data
+                    for user_data in await asyncio.to_thread(fetch_broadcast_users, [user_id for _, user_id, _ in batch])
+                }
+                results = []
+
+                async def deliver(task: tuple):
+                    nonlocal results
+                    run_id, user_id, attempts = task
+                    run = runs.setdefault(run_id, [BroadcastStats(), 0])
+                    if attempts == 1:
+                        run[1] += 1
+                    user_data = users.get(user_id)
+                    if user_data is None:
+                        # Пользователь удалил профиль после постановки в очередь
+                        run[0].counts['skipped'] += 1
+                        results.append((run_id, user_id, DELIVERY_DONE, 0))
+                    else:
+                        await pacer.wait()
+                        status, retry_after = await deliver_weekly_update(bot, user_data, run_id, run[0])
+                        if retry_after:
+                            # Telegram ограничил частоту для всего бота - ждем, сколько он попросил
+                            pacer.pause(retry_after)
+                        results.append((run_id, user_id, status, retry_after))
+                    # Подтверждаем порциями, чтобы при падении воркера не отправить пачку повторно целиком
+                    if len(results) >= BROADCAST_ACK_CHUNK:
+                        chunk, results = results, []
+                        await asyncio.to_thread(ack_broadcast_results, worker_id, chunk)
+
+                await run_concurrently(batch, deliver, BROADCAST_CONCURRENCY)
+                if results:
+                    await asyncio.to_thread(ack_broadcast_results, worker_id, results)
+                logger.debug("Воркер %s обработал пачку из %d задач", worker_id, len(batch))
+        finally:
+            log_broadcast_runs(worker_id, runs)
+    logger.info("Воркер рассылки %s остановлен: очередь пуста", worker_id)
+
+def cli(argv: list) -> None:
+    """Точка входа для служебных команд: импорт и экспорт пользователей, воркер рассылки"""
+    parser = argparse.ArgumentParser(prog="bot.py", description="Служебные команды бота")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for command, help_text in (("export-users", "выгрузить пользователей"), ("import-users", "загрузить пользователей")):
+        subparser = subparsers.add_parser(command, help=help_text)
+        subparser.add_argument("--format", choices=("csv", "binary"), default="csv")
+        subparser.add_argument("file", nargs="?", default="-", help="путь к файлу ('-' - stdin/stdout)")
+    subparser = subparsers.add_parser("enqueue-broadcast", help="поставить еженедельную рассылку в очередь")
+    subparser.add_argument("--run-id", type=date.fromisoformat, default=date.today(), help="дата рассылки (ГГГГ-ММ-ДД)")
+    subparser = subparsers.add_parser("broadcast-worker", help="отправлять уведомления из очереди рассылки")
+    subparser.add_argument("--batch-size", type=int, default=100)
+    subparser.add_argument("--idle-seconds", type=float, default=5, help="пауза, если очередь пуста")
+    subparser.add_argument("--once", action="store_true", help="завершиться, когда очередь опустеет")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command in ("export-users", "import-users"):
+            binary = args.format == "binary"
+            if args.command == "export-users":
+                if args.file == "-":
+                    export_users(sys.stdout.buffer if binary else sys.stdout, args.format)
+                else:
+                    with open(args.file, "wb" if binary else "w", newline="" if not binary else None,
+                              encoding=None if binary else "utf-8") as output:
+                        export_users(output, args.format)
+            else:
+                if args.file == "-":
+                    import_users(sys.stdin.buffer if binary else sys.stdin, args.format)
+                else:
+                    with open(args.file, "rb" if binary else "r", newline="" if not binary else None,
+                              encoding=None if binary else "utf-8") as source:
+                        import_users(source, args.format)
+        elif args.command == "enqueue-broadcast":
+            queued = enqueue_weekly_broadcast(args.run_id)
+            logger.info("В очередь рассылки %s добавлено пользователей: %d", args.run_id, queued)
+        else:
+            bot_token = os.environ.get('BOT_TOKEN')
+            if not bot_token:
+                logger.critical("Ошибка: Переменная окружения BOT_TOKEN не установлена")
+                sys.exit(1)
+            if not check_broadcast_calendar_layout():
+                sys.exit(1)
+            asyncio.run(run_broadcast_worker(
+                build_broadcast_bot(bot_token), args.batch_size, args.idle_seconds, args.once
+            ))
+    except psycopg2.Error as e:
+        logger.error("Ошибка при выполнении %s: %s", args.command, e)
+        sys.exit(1)
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    if len(sys.argv) > 1:
+        cli(sys.argv[1:])
+    else:
+        main()
@@ -0,0 +1,303 @@
+"""Локальная заглушка Telegram Bot API для нагрузочного тестирования бота.
+
+Принимает запросы бота (JSON, form-urlencoded и multipart с загрузкой фото),
+эмулирует ограничения Telegram (429 Too Many Requests), добавляет задержку
+ответа и отдает боту через getUpdates входящие сообщения, которые добавляет
+генератор нагрузки.
+
+Запуск:
+    python loadtest/fake_bot_api.py --port 8081 --latency-ms 50
+    BOT_API_BASE_URL=http://127.0.0.1:8081/bot python bot.py
+"""
+import argparse
+import itertools
+import json
+import logging
+import math
+import queue
+import random
+import threading
+import time
+from collections import Counter, deque
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+logging.basicConfig(
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+# Методы, ответ на которые считается ответом бота пользователю
+REPLY_METHODS = ("sendMessage", "sendPhoto")
+
+class RateLimiter:
+    """Ограничение частоты отправки: общий лимит и лимит на один чат (сообщений в секунду)"""
+    def __init__(self, global_rate: float, chat_rate: float):
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.lock = threading.Lock()
+        self.global_sent = deque()
+        self.chat_last_sent = {}
+
+    def acquire(self, chat_id) -> float:
+        """Возвращает 0, если отправка разрешена, иначе количество секунд до повтора"""
+        now = time.monotonic()
+        with self.lock:
+            if self.chat_rate > 0 and chat_id is not None:
+                last = self.chat_last_sent.get(chat_id)
+                interval = 1 / self.chat_rate
+                if last is not None and now - last < interval:
+                    return interval - (now - last)
+            if self.global_rate > 0:
+                while self.global_sent and now - self.global_sent[0] >= 1:
+                    self.global_sent.popleft()
+                if len(self.global_sent) >= self.global_rate:
+                    return 1 - (now - self.global_sent[0])
+                self.global_sent.append(now)
+            if chat_id is not None:
+                self.chat_last_sent[chat_id] = now
+            return 0
+
+class FakeBotApi:
+    """Состояние заглушки: очередь обновлений, ответы бота по чатам и счетчики"""
+    def __init__(self, global_rate: float = 30, chat_rate: float = 1,
+                 latency_ms: float = 0, jitter_ms: float = 0, upload_kbps: float = 0):
+        self.limiter = RateLimiter(global_rate, chat_rate)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.upload_kbps = upload_kbps
+
+        self.updates = deque()
+        self.updates_cond = threading.Condition()
+        self.update_ids = itertools.count(1)
+        self.message_ids = itertools.count(1)
+
+        # Очереди ответов по чатам создаются под блокировкой: их используют и потоки
+        # сервера, и потоки генератора нагрузки
+        self.replies = {}
+        self.replies_lock = threading.Lock()
+        self.stats = Counter()
+        self.stats_lock = threading.Lock()
+
+    def count(self, key: str, value: int = 1):
+        with self.stats_lock:
+            self.stats[key] += value
+
+    def reply_queue(self, chat_id: int) -> queue.Queue:
+        """Возвращает очередь ответов бота в чат, создавая ее при первом обращении"""
+        with self.replies_lock:
+            replies = self.replies.get(chat_id)
+            if replies is None:
+                replies = self.replies[chat_id] = queue.Queue()
+            return replies
+
+    def push_message(self, chat_id: int, text: str, first_name: str = "Load"):
+        """Добавляет входящее сообщение пользователя в очередь getUpdates"""
+        # Очередь ответов должна существовать до того, как бот увидит сообщение
+        self.reply_queue(chat_id)
+        message = {
+            "message_id": next(self.message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private", "first_name": first_name},
+            "from": {"id": chat_id, "is_bot": False, "first_name": first_name},
+            "text": text,
+        }
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        with self.updates_cond:
+            self.updates.append({"update_id": next(self.update_ids), "message": message})
+            self.updates_cond.notify_all()
+
+    def wait_reply(self, chat_id: int, timeout: float):
+        """Ждет очередной ответ бота в чат; возвращает (метод, параметры) или None"""
+        try:
+            return self.reply_queue(chat_id).get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def get_updates(self, offset: int, timeout: float) -> list:
+        deadline = time.monotonic() + timeout
+        with self.updates_cond:
+            while self.updates and self.updates[0]["update_id"] < offset:
+                self.updates.popleft()
+            while not self.updates:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return []
+                self.updates_cond.wait(remaining)
+            return list(itertools.islice(self.updates, 100))
+
+    def delay(self, upload_bytes: int):
+        """Эмулирует сетевую задержку и время загрузки файла"""
+        seconds = max(0.0, random.gauss(self.latency_ms, self.jitter_ms)) / 1000 if self.latency_ms else 0.0
+        if self.upload_kbps and upload_bytes:
+            seconds += upload_bytes / 1024 / self.upload_kbps
+        if seconds:
+            time.sleep(seconds)
+
+    def handle(self, method: str, params: dict, upload_bytes: int):
+        """Выполняет метод Bot API; возвращает (HTTP-статус, тело ответа)"""
+        self.count(f"method.{method}")
+        self.count("upload_bytes", upload_bytes)
+
+        if method == "getUpdates":
+            offset = int(params.get("offset") or 0)
+            timeout = float(params.get("timeout") or 0)
+            return 200, {"ok": True, "result": self.get_updates(offset, timeout)}
+
+        self.delay(upload_bytes)
+
+        if method == "getMe":
+            return 200, {"ok": True, "result": {
+                "id": 1, "is_bot": True, "first_name": "FakeBot", "username": "fake_bot",
+                "can_join_groups": False, "can_read_all_group_messages": False,
+                "supports_inline_queries": False,
+            }}
+
+        if method not in REPLY_METHODS:
+            return 200, {"ok": True, "result": True}
+
+        chat_id = int(params["chat_id"])
+        retry_after = self.limiter.acquire(chat_id)
+        if retry_after > 0:
+            self.count("rate_limited")
+            retry_after = math.ceil(retry_after)
+            return 429, {
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {retry_after}",
+                "parameters": {"retry_after": retry_after},
+            }
+
+        message = {
+            "message_id": next(self.message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+        }
+        if method == "sendPhoto":
+            file_id = f"fake-photo-{message['message_id']}"
+            message["photo"] = [{"file_id": file_id, "file_unique_id": file_id, "width": 1, "height": 1}]
+            if params.get("caption"):
+                message["caption"] = params["caption"]
+        else:
+            message["text"] = params.get("text", "")
+
+        self.reply_queue(chat_id).put((method, params))
+        return 200, {"ok": True, "result": message}
+
+    def snapshot(self) -> dict:
+        with self.stats_lock:
+            return dict(self.stats)
+
+def parse_body(content_type: str, body: bytes) -> tuple:
+    """Разбирает тело запроса; возвращает (параметры, размер загруженных файлов в байтах)"""
+    if not body:
+        return {}, 0
+    if content_type.startswith("application/json"):
+        return json.loads(body), 0
+    if content_type.startswith("multipart/form-data"):
+        message = BytesParser(policy=HTTP).parsebytes(
+            b"Content-Type: " + content_type.encode() + b"\r\n\r\n" + body
+        )
+        params, upload_bytes = {}, 0
+        for part in message.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            payload = part.get_payload(decode=True) or b""
+            if part.get_filename():
+                upload_bytes += len(payload)
+            else:
+                params[name] = payload.decode()
+        return params, upload_bytes
+    return dict(parse_qsl(body.decode())), 0
+
+def make_handler(api: FakeBotApi):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            logger.debug(format, *args)
+
+        def send_json(self, status: int, payload: dict):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/_stats":
+                self.send_json(200, api.snapshot())
+                return
+            self.dispatch(url, dict(parse_qsl(url.query)), 0)
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length)
+            if url.path == "/_messages":
+                # Служебный метод: [{"chat_id": ..., "text": ...}, ...]
+                for item in json.loads(body):
+                    api.push_message(int(item["chat_id"]), item["text"])
+                self.send_json(200, {"ok": True})
+                return
+            params, upload_bytes = parse_body(self.headers.get("Content-Type", ""), body)
+            self.dispatch(url, params, upload_bytes)
+
+        def dispatch(self, url, params: dict, upload_bytes: int):
+            # Путь вида /bot<token>/<method>
+            method = url.path.rstrip("/").rsplit("/", 1)[-1]
+            try:
+                status, payload = api.handle(method, params, upload_bytes)
+            except (KeyError, ValueError) as e:
+                status, payload = 400, {"ok": False, "error_code": 400, "description": f"Bad Request: {e}"}
+            self.send_json(status, payload)
+
+    return Handler
+
+def start_server(api: FakeBotApi, host: str, port: int) -> ThreadingHTTPServer:
+    """Запускает HTTP-сервер заглушки в фоновом потоке"""
+    server = ThreadingHTTPServer((host, port), make_handler(api))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info("Заглушка Bot API слушает http://%s:%d/bot", host, port)
+    return server
+
+def add_server_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--global-rate", type=float, default=30, help="сообщений в секунду всего (0 - без лимита)")
+    parser.add_argument("--chat-rate", type=float, default=1, help="сообщений в секунду в один чат (0 - без лимита)")
+    parser.add_argument("--latency-ms", type=float, default=0, help="средняя задержка ответа")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="стандартное отклонение задержки")
+    parser.add_argument("--upload-kbps", type=float, default=0, help="скорость загрузки файлов (0 - мгновенно)")
+
+def api_from_args(args) -> FakeBotApi:
+    return FakeBotApi(
+        global_rate=args.global_rate,
+        chat_rate=args.chat_rate,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        upload_kbps=args.upload_kbps,
+    )
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Локальная заглушка Telegram Bot API")
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    api = api_from_args(args)
+    server = start_server(api, args.host, args.port)
+    try:
+        while True:
+            time.sleep(10)
+            logger.info("Статистика: %s", json.dumps(api.snapshot(), ensure_ascii=False))
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
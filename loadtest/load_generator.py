@@ -0,0 +1,164 @@
+"""Генератор нагрузки: N синтетических пользователей проходят сценарии диалога бота.
+
+Поднимает заглушку Bot API (fake_bot_api.py) в том же процессе, по очереди
+отправляет от имени каждого пользователя сообщения сценария и ждет ответа бота,
+измеряя задержку каждого шага. В конце печатает пропускную способность и
+перцентили задержек.
+
+Лимит на один чат по умолчанию выключен (--chat-rate 0): сценарий отправляет
+ответ на каждый шаг сразу после предыдущего, и лимит 1 сообщение в секунду
+превратил бы замер задержек в замер ответов 429.
+
+Бот запускается отдельно и должен смотреть на заглушку и тестовую базу данных:
+    python loadtest/load_generator.py --users 200 --concurrency 50
+    BOT_API_BASE_URL=http://127.0.0.1:8081/bot DB_NAME=weekly_reminder_load python bot.py
+
+Либо с флагом --spawn-bot генератор сам запустит bot.py с нужными переменными окружения.
+"""
+import argparse
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from fake_bot_api import add_server_arguments, api_from_args, logger, start_server
+
+# Идентификаторы синтетических пользователей начинаются с этого значения,
+# чтобы не пересекаться с реальными чатами в тестовой базе
+USER_ID_OFFSET = 9_000_000_000
+
+def scenario(user_index: int) -> list:
+    """Сценарий пользователя: (название шага, текст сообщения, ожидаемое число ответов)"""
+    birthdate = date(1950, 1, 1) + timedelta(days=random.randrange(365 * 60))
+    return [
+        ("start", "/start", 1),
+        ("registration", "📝 Регистрация", 1),
+        ("name", f"User{user_index}", 1),
+        ("birthdate", birthdate.strftime("%d.%m.%Y"), 1),
+        ("statistics", "📊 Моя статистика", 1),
+        ("calendar", "📅 Календарь жизни", 1),
+        ("edit_profile", "✏️ Изменить данные", 1),
+        ("edit_life_expectancy", "⏳ Изменить продолжительность жизни", 1),
+        ("life_expectancy", random.choice(["70 лет", "80 лет", "90 лет"]), 1),
+        ("edit_profile", "✏️ Изменить данные", 1),
+        ("edit_name", "✏️ Изменить имя", 1),
+        ("new_name", f"Renamed{user_index}", 1),
+    ]
+
+def cleanup_scenario() -> list:
+    return [
+        ("edit_profile", "✏️ Изменить данные", 1),
+        ("delete_profile", "❌ Удалить профиль", 1),
+        ("delete_confirm", "✅ Да, удалить профиль", 1),
+    ]
+
+def run_user(api, user_index: int, steps: list, timeout: float) -> dict:
+    """Проходит сценарий одного пользователя; возвращает задержки шагов и ошибки"""
+    chat_id = USER_ID_OFFSET + user_index
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    for step, text, expected_replies in steps:
+        started = time.perf_counter()
+        api.push_message(chat_id, text)
+        for _ in range(expected_replies):
+            if api.wait_reply(chat_id, timeout) is None:
+                errors[step] += 1
+                # Диалог рассинхронизирован - остальные шаги не имеют смысла
+                return {"latencies": latencies, "errors": errors}
+        latencies[step].append(time.perf_counter() - started)
+    return {"latencies": latencies, "errors": errors}
+
+def percentile(values: list, p: float) -> float:
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(p / 100 * len(values)) - 1))
+    return values[index]
+
+def report(results: list, elapsed: float, api) -> None:
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    for result in results:
+        for step, values in result["latencies"].items():
+            latencies[step].extend(values)
+        for step, count in result["errors"].items():
+            errors[step] += count
+
+    total = sum(len(values) for values in latencies.values())
+    print(f"Пользователей: {len(results)}, шагов: {total}, время: {elapsed:.2f} с, "
+          f"пропускная способность: {total / elapsed:.1f} шагов/с")
+    print(f"{'шаг':<24}{'n':>7}{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}{'ошибок':>8}")
+    for step in sorted(set(latencies) | set(errors)):
+        values = latencies.get(step) or [0.0]
+        print(f"{step:<24}{len(latencies.get(step, [])):>7}"
+              f"{percentile(values, 50) * 1000:>10.1f}{percentile(values, 95) * 1000:>10.1f}"
+              f"{percentile(values, 99) * 1000:>10.1f}{errors.get(step, 0):>8}")
+    print(f"Статистика заглушки: {api.snapshot()}")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Генератор нагрузки для бота")
+    add_server_arguments(parser)
+    parser.set_defaults(chat_rate=0)
+    parser.add_argument("--users", type=int, default=100, help="число синтетических пользователей")
+    parser.add_argument("--concurrency", type=int, default=20, help="одновременно активных пользователей")
+    parser.add_argument("--timeout", type=float, default=30, help="ожидание ответа бота, с")
+    parser.add_argument("--seed", type=int, default=0, help="seed для воспроизводимых сценариев")
+    parser.add_argument("--no-cleanup", action="store_true", help="не удалять профили после сценария")
+    parser.add_argument("--spawn-bot", action="store_true", help="запустить bot.py с адресом заглушки")
+    parser.add_argument("--startup-timeout", type=float, default=60,
+                        help="сколько ждать первого запроса getUpdates от бота, с")
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    api = api_from_args(args)
+    server = start_server(api, args.host, args.port)
+
+    bot_process = None
+    if args.spawn_bot:
+        env = dict(os.environ, BOT_API_BASE_URL=f"http://{args.host}:{args.port}/bot",
+                   BOT_TOKEN=os.environ.get("BOT_TOKEN") or "1:load-test")
+        bot_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "bot.py")
+        bot_process = subprocess.Popen([sys.executable, bot_path], env=env)
+    else:
+        logger.info("Запустите бота с BOT_API_BASE_URL=http://%s:%d/bot", args.host, args.port)
+
+    # Ждем, пока бот начнет опрашивать getUpdates
+    deadline = time.monotonic() + args.startup_timeout
+    while not api.snapshot().get("method.getUpdates"):
+        if bot_process and bot_process.poll() is not None:
+            logger.error("bot.py завершился с кодом %s, не начав опрашивать getUpdates", bot_process.returncode)
+            server.shutdown()
+            sys.exit(1)
+        if time.monotonic() > deadline:
+            logger.error("Бот не начал опрашивать getUpdates за %.0f с", args.startup_timeout)
+            if bot_process:
+                bot_process.terminate()
+                bot_process.wait()
+            server.shutdown()
+            sys.exit(1)
+        time.sleep(0.2)
+
+    # Сценарии строятся заранее, чтобы при одном seed они не зависели от порядка потоков
+    scenarios = [
+        scenario(index) + ([] if args.no_cleanup else cleanup_scenario())
+        for index in range(args.users)
+    ]
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = list(executor.map(
+            lambda index: run_user(api, index, scenarios[index], args.timeout),
+            range(args.users)
+        ))
+    elapsed = time.perf_counter() - started
+    report(results, elapsed, api)
+
+    if bot_process:
+        bot_process.terminate()
+        bot_process.wait()
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()